@@ -1,12 +1,23 @@
 import os
-import json
 import time
 import hashlib
-import shutil
-from typing import List, Dict, Any
+import argparse
+import threading
+from typing import List, Dict, Any, Optional
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.backends import default_backend
+from chainstate import (ChainState, UtxoView, TxReject, TxResult, load_checkpoint,
+                        write_json_atomic, atomic_tmp_path, fsync_dir,
+                        MALFORMED, BAD_TXID, BAD_OUTPUT, DUPLICATE_INPUT, MISSING_INPUT,
+                        DOUBLE_SPEND, NOT_OWNER, OVERSPEND, BAD_SIGNATURE, UNREADABLE)
+from chain_index import ChainIndex
+from block_journal import BlockJournal, JOURNAL_FILE
+import jsonio
+import proof_of_work
+import metrics
+import profiling
+import txfiles
 
 
 # block height counter
@@ -34,16 +45,45 @@ PENDING_DIR = "PendingTransactions"
 PROCESSED_DIR = "ProcessedTransactions"
 BLOCKS_DIR = "Blocks"
 
-# Make sure directories exist
-os.makedirs(PENDING_DIR, exist_ok=True)
-os.makedirs(PROCESSED_DIR, exist_ok=True)
-os.makedirs(BLOCKS_DIR, exist_ok=True)
-# keep an 'invalid' bucket for rejects
-os.makedirs(os.path.join(PROCESSED_DIR, "invalid"), exist_ok=True)
+# optional proof-of-work: POW=1 python Block.py  (POW_WORKERS defaults to all cores)
+# the target is retargeted every block from recent timestamps, see proof_of_work.py
+POW_ENABLED = os.environ.get("POW", "0") == "1"
+POW_WORKERS = int(os.environ.get("POW_WORKERS", "0")) or None
+
+# assume-valid checkpoint (see validate_chain.py --write-checkpoint): blocks up to
+# it skip signature checks when the chain is loaded; new blocks are always fully checked
+ASSUME_VALID_FILE = os.environ.get("ASSUME_VALID", "checkpoint.json")
+
+# sqlite address index of the active chain, read by Launcher.py; CHAIN_INDEX= disables
+CHAIN_INDEX_DB = os.environ.get("CHAIN_INDEX", "chain_index.db")
+
+# optional JSON-RPC server in this process: RPC_PORT=8545 python Block.py (see rpc.py);
+# it also serves the stage timings below as Prometheus text on GET /metrics
+RPC_PORT = int(os.environ.get("RPC_PORT", "0"))
+
+# per-stage timings/counters as a JSON file rewritten after every pass (see metrics.py)
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+
+# block commits are journaled and fsynced (see block_journal.py); FSYNC=0 skips
+# the fsyncs and trades crash safety for speed, for benchmarks
+FSYNC = os.environ.get("FSYNC", "1") != "0"
+journal = BlockJournal(os.environ.get("BLOCK_JOURNAL", JOURNAL_FILE), fsync=FSYNC)
+
+# processed transactions are archived as one segment file per block,
+# ProcessedTransactions/<block hash>.segment.json (the pending file names; the
+# txs are in the block), and rejects as one per pass under invalid/ (with content)
+SEGMENT_SUFFIX = ".segment.json"
+SYNC_ALL_ABOVE = 64  # shard dirs touched by one sweep before fsyncing each stops paying
+
+# in-memory block tree + utxo set, built once and updated as blocks arrive;
+# state_lock guards it against the RPC server threads
+chain_state = None
+chain_index = None
+state_lock = threading.RLock()
 
 def canonical(obj) -> str:
     # stable, whitespace-free JSON
-    return json.dumps(obj, separators=(',', ':'), sort_keys=True)
+    return jsonio.canonical(obj)
 
 def merkle_root(txids: List[str]) -> str:
     if not txids:
@@ -80,8 +120,8 @@ def load_blocks() -> List[Dict[str, Any]]:
     for fname in list_block_files():
         path = os.path.join(BLOCKS_DIR, fname)
         try:
-            with open(path, "r") as f:
-                blk = json.load(f)
+            with open(path, "rb") as f:
+                blk = jsonio.load(f)
         except Exception:
             # unreadable -> skip
             continue
@@ -119,7 +159,18 @@ def build_utxos(blocks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
 
 
 def process_pending_transactions():
-    pending_files = os.listdir(PENDING_DIR)
+    with metrics.stage("process_pending"):
+        _process_pending_transactions()
+
+
+def _process_pending_transactions():
+    global transactions, rejected_transactions, valdidated_transactions, rejected_files
+    # per-pass lists; anything left from the last pass has already been moved
+    transactions, rejected_transactions, valdidated_transactions, rejected_files = [], [], [], []
+
+    with metrics.stage("listdir"):
+        pending_files = txfiles.list_sorted(PENDING_DIR)  # relative paths, see txfiles.py
+    metrics.set_gauge("pending_files", len(pending_files))
     if not pending_files:
         print("No pending transactions to include in block.")
         return
@@ -131,43 +182,55 @@ def process_pending_transactions():
     transactions.append({ "hash": filename.replace(".json", ""),"content": content })
     '''
 
-    chain = load_blocks()
-    utxos = build_utxos(chain)
+    state = get_chain_state()
+    with state_lock:
+        with metrics.stage("chain_refresh"):
+            state.refresh()  # pick up blocks from other miners sharing Blocks/
+        # copy-on-write view instead of a full copy; only this thread changes
+        # state.utxos (refresh / add_block), so it stays put for the pass
+        utxos = UtxoView(state.utxos)
+    metrics.set_gauge("utxo_set_size", len(state.utxos))
     #utxos = build_utxos(blocks)
+    rejects: Dict[str, Dict[str, Any]] = {}  # file -> archive entry
     
     # Validate sequentially and update temp UTXO view so later txs in the same block can spend newly created outputs
-    for fname in sorted(pending_files):
+    for fname in pending_files:
         path = os.path.join(PENDING_DIR, fname)
         try:
-            with open(path, "r") as f:
-                tx = json.load(f)
+            with metrics.stage("read_json"), open(path, "rb") as f:
+                tx = jsonio.load(f)
                 #content = json.load(f)
                 transactions.append(tx)
         except Exception:
-            print(f"Rejected: {fname}")
-            rejected_transaction.append(fname)
+            print(f"Rejected -> ({UNREADABLE}) could not read: {fname}")
+            metrics.inc("transactions_total", result="rejected")
+            metrics.inc("rejects_total", reason=UNREADABLE)
+            rejects[fname] = {"code": UNREADABLE, "raw": read_raw(path)}
+            rejected_transactions.append(fname)
             rejected_files.append(fname)
             continue
 
-        if validate_transaction(tx, utxos):
+        with metrics.stage("validate"):
+            result = validate_transaction(tx, utxos)
+        if result:
+            metrics.inc("transactions_total", result="accepted")
             valid_transactions.append(tx)
             valdidated_transactions.append(fname)
             included_files.append(fname)
             # apply to utxo view
-            txid = tx["txid"]
-            for inp in tx["inputs"]:
-                utxos.pop(f"{inp['prev_txid']}:{inp['prev_index']}", None)
-            for idx, outp in enumerate(tx["body"]["outputs"]):
-                utxos[f"{txid}:{idx}"] = {"value": outp["value"], "address": outp["address"]}
+            utxos.apply(tx)
         else:
-            print(f"Rejected -> (invalid signature): {fname}")
+            print(f"Rejected -> ({result.code}) {result.reject}: {fname}")
+            metrics.inc("transactions_total", result="rejected")
+            metrics.inc("rejects_total", reason=result.code)
+            rejects[fname] = {"code": result.code, "reason": result.reject, "tx": tx}
             rejected_transactions.append(fname)
             rejected_files.append(fname)
 
-    # Move rejected to processed/invalid
-    for fname in rejected_transactions:
-        shutil.move(os.path.join(PENDING_DIR, fname),
-                    os.path.join(PROCESSED_DIR, "invalid", fname))
+    # Archive rejected to processed/invalid as one segment per pass
+    if rejects:
+        with metrics.stage("archive_rejected"):
+            archive_rejected(rejects)
 
     if not valid_transactions:
         print("No valid transactions.")
@@ -175,41 +238,118 @@ def process_pending_transactions():
 
 
 
-def get_last_block():
-    best = None
-    for fname in list_block_files():
-        path = os.path.join(BLOCKS_DIR, fname)
+def read_raw(path: str) -> Optional[str]:
+    # what an unreadable pending file held, kept for the invalid/ archive
+    try:
+        with open(path, "r", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def archive_included(bhash: str, height: int, files: List[str],
+                     pending_dir: str = PENDING_DIR, processed_dir: str = PROCESSED_DIR) -> int:
+    # one segment file per block instead of one move per transaction: the txs
+    # themselves are already in Blocks/<bhash>.json, so it records which pending
+    # files they came from, and the files go in a single sweep. Safe to
+    # repeat, so recovery replays it. node.py passes its own data dir
+    seg = os.path.join(processed_dir, bhash + SEGMENT_SUFFIX)
+    if not os.path.exists(seg):
+        write_json_atomic(seg, {"block": bhash, "height": height, "files": files}, fsync=FSYNC)
+    return remove_pending(files, pending_dir)
+
+
+def archive_rejected(rejects: Dict[str, Dict[str, Any]],
+                     pending_dir: str = PENDING_DIR, processed_dir: str = PROCESSED_DIR) -> int:
+    # rejects ({pending file: {"code", "reason", "tx"}}) as one segment under invalid/
+    seg = os.path.join(processed_dir, "invalid", f"{time.time_ns()}{SEGMENT_SUFFIX}")
+    write_json_atomic(seg, {"rejected": rejects}, fsync=FSYNC, separators=(',', ':'))
+    return remove_pending(list(rejects), pending_dir)
+
+
+def remove_pending(files: List[str], pending_dir: str = PENDING_DIR) -> int:
+    # delete archived pending files (skipping ones already gone), then make
+    # the whole sweep durable: one fsync per touched shard directory, or a
+    # single sync() once a big block touches more shards than that is worth
+    removed = 0
+    dirs = set()
+    for fname in files:
+        path = os.path.join(pending_dir, fname)
         try:
-            with open(path, "r") as f:
-                blk = json.load(f)
-        except Exception:
-            # print(f"[skip] unreadable file: {fname}")
-            continue
-
-        header = blk.get("header")
-        body   = blk.get("body")
-        if not isinstance(header, dict) or not isinstance(body, list):
-            # print(f"[skip] non-block JSON: {fname}")
-            continue
+            os.remove(path)
+            removed += 1
+            dirs.add(os.path.dirname(path))
+        except FileNotFoundError:
+            pass
+    if FSYNC and len(dirs) > SYNC_ALL_ABOVE and hasattr(os, "sync"):
+        os.sync()
+    elif FSYNC:
+        for d in dirs:
+            fsync_dir(d)
+    return removed
+
+
+def recover_journal() -> None:
+    # finish or drop block commits a crash interrupted; run before mining
+    for rec in journal.incomplete():
+        path = os.path.join(BLOCKS_DIR, rec["block"] + ".json")
+        if os.path.exists(path):
+            removed = archive_included(rec["block"], rec.get("height"), rec["files"])
+            print(f"[recovery] block {rec['block']} was committed; archived {removed} included transaction(s)")
+        else:
+            print(f"[recovery] block {rec['block']} never reached {BLOCKS_DIR}/; its transactions stay pending")
+        if rec.get("tmp"):
+            try:
+                os.remove(rec["tmp"])  # our torn block write; other miners' temp files stay
+            except FileNotFoundError:
+                pass
+    journal.done()
+
+
+def make_dirs() -> None:
+    # the miner's working directories; not done at import, so node.py,
+    # reconciler.py and validate_chain.py can use the validators above
+    # without leaving empty dirs wherever they run
+    os.makedirs(PENDING_DIR, exist_ok=True)
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    os.makedirs(BLOCKS_DIR, exist_ok=True)
+    # keep an 'invalid' bucket for rejects
+    os.makedirs(os.path.join(PROCESSED_DIR, "invalid"), exist_ok=True)
+
+
+def get_chain_state() -> ChainState:
+    global chain_state, chain_index
+    with state_lock:
+        if chain_state is None:
+            make_dirs()
+            chain_state = ChainState(BLOCKS_DIR, validate_tx=validate_transaction,
+                                     assume_valid=load_checkpoint(ASSUME_VALID_FILE))
+            chain_state.load()
+            if CHAIN_INDEX_DB:
+                chain_index = ChainIndex(CHAIN_INDEX_DB, BLOCKS_DIR)
+                chain_index.attach(chain_state)
+    return chain_state
 
-        h = header.get("height")
-        if not isinstance(h, int):
-            # print(f"[skip] invalid height in: {fname}")
-            continue
 
-        if best is None or h > best[0]:
-            best = (h, fname, blk)
-    return best
+def get_last_block():
+    # tip of the best chain (most work, first seen on ties), not just max height
+    return get_chain_state().get_last_block()
 
 
 def create_block():
+    with metrics.stage("create_block"):
+        _create_block()
+
+
+def _create_block():
     global valid_transactions, included_files
     if not valid_transactions:           
         return
 
     txids = [t["txid"] for t in valid_transactions]
-    body_hash = hashlib.sha256(json.dumps(valid_transactions, separators=(',', ':')).encode()).hexdigest()
+    body_hash = hashlib.sha256(jsonio.compact(valid_transactions).encode()).hexdigest()
 
+    state = get_chain_state()
     last = get_last_block()
     if last:
         prev_height, prev_fname, _ = last
@@ -226,80 +366,130 @@ def create_block():
         "merkle_root": merkle_root(txids),
         "hash": body_hash
     }
+    if POW_ENABLED:
+        # header["timestamp"] must stay above the median of recent blocks
+        if state.tip is not None:
+            mtp = proof_of_work.median_time_past(list(state.tip.timestamps))
+            header["timestamp"] = max(header["timestamp"], int(mtp) + 1)
+        with metrics.stage("mine"):
+            stats = proof_of_work.mine(header, state.next_target(state.tip), POW_WORKERS)
+        print(f"Mined nonce {stats['nonce']} in {stats['seconds']:.2f}s "
+              f"({stats['hashrate'] / 1000:.1f} kH/s on {stats['workers']} worker(s))")
     block_obj = {"header": header, "body": valid_transactions}
 
-    fname = hashlib.sha256(canonical(header).encode()).hexdigest() + ".json"
-    out_path = os.path.join(BLOCKS_DIR, fname)
-    with open(out_path, "w") as f:
-        json.dump(block_obj, f, indent=2)
+    bhash = hashlib.sha256(canonical(header).encode()).hexdigest()
+    out_path = os.path.join(BLOCKS_DIR, bhash + ".json")
+    # journaled commit, see block_journal.py: intent, atomic block write, moves, done
+    with metrics.stage("journal_begin"):
+        journal.begin(bhash, height, included_files, tmp=atomic_tmp_path(out_path))
+    with metrics.stage("write_block"):
+        write_json_atomic(out_path, block_obj, fsync=FSYNC, indent=2)
 
     print(f"Block saved as {out_path}")
-
-    # move only those we included
-    for filename in included_files:
-        shutil.move(os.path.join(PENDING_DIR, filename),
-                    os.path.join(PROCESSED_DIR, filename))
-    print("Transactions processed and moved.")
+    with state_lock, metrics.stage("chain_add"):
+        # every tx was fully validated above, signatures included
+        state.add_block(block_obj, bhash, check_signatures=False)
+
+    # archive only those we included
+    with metrics.stage("archive_included"):
+        archive_included(bhash, height, included_files)
+    journal.done()
+    print("Transactions processed and archived.")
+    metrics.inc("blocks_total")
+    metrics.set_gauge("chain_height", height)
+    metrics.set_gauge("last_block_transactions", len(valid_transactions))
 
     # reset for next loop
     valid_transactions = []
     included_files = []
 
 
-def validate_transaction(tx, utxos):
-    # Structure
-    if "txid" not in tx or "body" not in tx or "inputs" not in tx:
-        return False
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _list_of_dicts(value) -> bool:
+    return isinstance(value, list) and all(isinstance(v, dict) for v in value)
+
+
+def check_tx_stateless(tx, check_signatures=True) -> Optional[TxReject]:
+    # everything that can be checked from the transaction alone;
+    # returns a TxReject (reason string with a .code), or None if it passes.
+    # Shapes are checked before anything indexes into them, so no input
+    # makes this (or check_tx_stateful after it) raise
+    if not isinstance(tx, dict) or not isinstance(tx.get("txid"), str) \
+            or not isinstance(tx.get("body"), dict) or not _list_of_dicts(tx.get("inputs")):
+        return TxReject(MALFORMED, "malformed transaction")
     body = tx["body"]
-    if "inputs" not in body or "outputs" not in body:
-        return False
+    if not _list_of_dicts(body.get("inputs")) or not _list_of_dicts(body.get("outputs")):
+        return TxReject(MALFORMED, "malformed transaction body")
 
     # txid integrity
-    expected_txid = hashlib.sha256(canonical(body).encode()).hexdigest()
-    if tx["txid"] != expected_txid:
-        return False
+    body_bytes = canonical(body).encode()
+    if tx["txid"] != hashlib.sha256(body_bytes).hexdigest():
+        return TxReject(BAD_TXID, "txid does not match body")
 
     # outputs sane
-    total_out = 0
     for o in body["outputs"]:
-        if "value" not in o or "address" not in o:
-            return False
-        if not isinstance(o["value"], int) or o["value"] < 0:
-            return False
-        total_out += o["value"]
+        if "value" not in o or not isinstance(o.get("address"), str):
+            return TxReject(MALFORMED, "malformed output")
+        if not _is_int(o["value"]) or o["value"] < 0:
+            return TxReject(BAD_OUTPUT, "bad output value")
 
-    # inputs: signatures + ownership + sum values from UTXO set
-    body_bytes = canonical(body).encode()
     seen_inputs = set()
-    total_in = 0
     for inp in tx["inputs"]:
-        for k in ("prev_txid", "prev_index", "pubkey", "signature"):
-            if k not in inp:
-                return False
-
+        if not (isinstance(inp.get("prev_txid"), str) and _is_int(inp.get("prev_index"))
+                and isinstance(inp.get("pubkey"), str) and isinstance(inp.get("signature"), str)):
+            return TxReject(MALFORMED, "malformed input")
         key = f"{inp['prev_txid']}:{inp['prev_index']}"
         if key in seen_inputs:
-            return False
+            return TxReject(DUPLICATE_INPUT, f"input {key} spent twice")
         seen_inputs.add(key)
 
+    return check_tx_signatures(tx) if check_signatures else None
+
+
+def check_tx_signatures(tx) -> Optional[TxReject]:
+    # verify signatures over body (validate_chain.py checks these in a pool instead)
+    body_bytes = canonical(tx["body"]).encode()
+    with metrics.stage("verify_signatures"):
+        for inp in tx["inputs"]:
+            if not verify_signature(inp["pubkey"], body_bytes, inp["signature"]):
+                return TxReject(BAD_SIGNATURE, "bad signature")
+    return None
+
+
+def check_tx_stateful(tx, utxos) -> Optional[TxReject]:
+    # inputs against a utxo view; assumes check_tx_stateless() passed
+    total_in = 0
+    for inp in tx["inputs"]:
+        key = f"{inp['prev_txid']}:{inp['prev_index']}"
         utxo = utxos.get(key)
         if not utxo:
-            return False  # double-spend or missing UTXO
-
-        # verify signature over body
-        if not verify_signature(inp["pubkey"], body_bytes, inp["signature"]):
-            return False
+            # a UtxoView remembers what earlier txs in the same batch spent
+            if key in getattr(utxos, "removed", ()):
+                return TxReject(DOUBLE_SPEND, f"input {key} already spent by an earlier transaction")
+            return TxReject(MISSING_INPUT, f"input {key} missing or already spent")
 
         # enforce ownership: pubkey address must match the UTXO’s address
         if address_from_pub(inp["pubkey"]) != utxo["address"]:
-            return False
+            return TxReject(NOT_OWNER, f"input {key} not owned by signer")
 
         total_in += utxo["value"]
 
-    if total_out > total_in:
-        return False  # overspend
+    if sum(o["value"] for o in tx["body"]["outputs"]) > total_in:
+        return TxReject(OVERSPEND, "outputs exceed inputs")
+    return None
+
 
-    return True
+def validate_transaction(tx, utxos, check_signatures=True) -> TxResult:
+    # cheap structural and utxo checks first, RSA last, so a double spend or
+    # overspend never pays for a signature check. The result is truthy when
+    # valid; .code / .reject say why not
+    reject = check_tx_stateless(tx, check_signatures=False) or check_tx_stateful(tx, utxos)
+    if reject is None and check_signatures:
+        reject = check_tx_signatures(tx)
+    return TxResult(reject)
 
 
 
@@ -311,21 +501,41 @@ def validate_transaction(tx, utxos):
 
 #if we need to run in the background add:
 
-while True:
+def mining_cycle() -> Dict[str, Any]:
+    # one pass of the main loop; returns the tags --profile records
     process_pending_transactions()
-    if valid_transactions:   
+    batch = len(valid_transactions)
+    if valid_transactions:
         create_block()
-    print("Waiting for new transactions...")
-    time.sleep(5)
-
-
-
-
-
-
-
-
-
-
-
-
+    if METRICS_FILE:
+        metrics.REGISTRY.write_json(METRICS_FILE)
+    tip = get_chain_state().tip
+    return {"height": tip.height if tip is not None else -1, "batch": batch}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Mine PendingTransactions/ into Blocks/.")
+    ap.add_argument("--profile", type=int, default=0, metavar="N",
+                    help="run N cycles under cProfile, writing one profile per cycle, then exit")
+    ap.add_argument("--profile-dir", default=profiling.PROFILE_DIR)
+    args = ap.parse_args()
+
+    make_dirs()
+    recover_journal()
+    if RPC_PORT:
+        import rpc
+        service = rpc.RpcService(get_chain_state(), PENDING_DIR, state_lock,
+                                 precheck_tx=check_tx_stateless, check_tx=check_tx_stateful,
+                                 history=chain_index)
+        rpc.start_server(service, RPC_PORT)
+    cycle = 0
+    while True:
+        cycle += 1
+        if args.profile:
+            profiling.profile_cycle(mining_cycle, "miner", cycle, args.profile_dir)
+            if cycle >= args.profile:
+                break
+        else:
+            mining_cycle()
+        print("Waiting for new transactions...")
+        time.sleep(5)
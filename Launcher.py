@@ -5,13 +5,21 @@
 import os
 import sys
 import json
+import time
+import hmac
+import hashlib
+import sqlite3
 import getpass
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import random
 import tkinter as tk
 from PIL import Image, ImageTk
 from tkinter import messagebox
+from chain_index import ChainIndex
+from store_db import StorePool
 
 
 #  CONFIG
@@ -20,28 +28,223 @@ API_BASE = "http://localhost:4000"
 GAME_ID = 8                    # Change to  DB game id
 TITLE_PATH = r"G:\title_screen.png"   # Change if needed
 
+REQUEST_TIMEOUT = (3, 10)       # (connect, read) seconds
+REQUEST_RETRIES = 3
+
+# entitlement cache: a granted license is reused for ENTITLEMENT_TTL without
+# asking the store, and for up to OFFLINE_GRACE when the store can't be reached.
+# Entries are HMAC-signed with a per-machine key so editing the file doesn't work.
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".tinydeck", "entitlements.json")
+CACHE_KEY_PATH = os.path.join(os.path.expanduser("~"), ".tinydeck", "cache.key")
+# local ownership check: the purchase tx from the store DB must pay the user's
+# wallet on chain (chain_index.db is kept current by the miner, see chain_index.py)
+STORE_DB = "game_store.db"
+CHAIN_INDEX_DB = "chain_index.db"
+BLOCKS_DIR = "Blocks"
+
+ENTITLEMENT_TTL = 24 * 3600
+OFFLINE_GRACE = 7 * 24 * 3600
+
+
+#  HTTP SESSION
+
+_session = None
+
+def get_session() -> requests.Session:
+    """One pooled keep-alive session, with retries on connection errors and 5xx."""
+    global _session
+    if _session is None:
+        retry = Retry(total=REQUEST_RETRIES, backoff_factor=0.3,
+                      status_forcelist=(502, 503, 504), allowed_methods=("GET", "POST"))
+        _session = requests.Session()
+        _session.mount("http://", HTTPAdapter(max_retries=retry))
+        _session.mount("https://", HTTPAdapter(max_retries=retry))
+    return _session
+
+
+#  ENTITLEMENT CACHE
+
+def _cache_key() -> bytes:
+    if not os.path.exists(CACHE_KEY_PATH):
+        os.makedirs(os.path.dirname(CACHE_KEY_PATH), exist_ok=True)
+        fd = os.open(CACHE_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(32))
+    with open(CACHE_KEY_PATH, "rb") as f:
+        return f.read()
+
+
+def _sign(entry: dict) -> str:
+    data = json.dumps(entry, sort_keys=True, separators=(',', ':')).encode()
+    return hmac.new(_cache_key(), data, hashlib.sha256).hexdigest()
+
+
+def _load_cache() -> dict:
+    try:
+        with open(CACHE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache: dict) -> None:
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    tmp = CACHE_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, CACHE_PATH)
+
+
+def _cache_get(name: str, max_age: float):
+    """Return the cached value if its signature checks out and it is younger than max_age."""
+    item = _load_cache().get(name)
+    if not isinstance(item, dict) or "entry" not in item or "sig" not in item:
+        return None
+    if not hmac.compare_digest(item["sig"], _sign(item["entry"])):
+        return None
+    if time.time() - item["entry"].get("saved_at", 0) > max_age:
+        return None
+    return item["entry"]["value"]
+
+
+def _cache_put(name: str, value) -> None:
+    cache = _load_cache()
+    entry = {"name": name, "value": value, "saved_at": int(time.time())}
+    cache[name] = {"entry": entry, "sig": _sign(entry)}
+    _save_cache(cache)
+
+
+def _cache_drop(name: str) -> None:
+    cache = _load_cache()
+    if cache.pop(name, None) is not None:
+        _save_cache(cache)
+
+
+def _stored_password_hash(username: str) -> str:
+    """The user's password hash from the local store DB, "" if it can't be read here."""
+    if not os.path.exists(STORE_DB):
+        return ""
+    try:
+        store = StorePool(STORE_DB, size=1, readonly=True)
+        try:
+            return store.password_hash(username) or ""
+        finally:
+            store.close()
+    except sqlite3.Error:
+        return ""
+
+
+def _password_tag(username: str, password: str, stored_hash: str) -> str:
+    # lets a cached login be checked offline without storing the password; the
+    # stored hash is part of the salt, so a password change invalidates the tag
+    salt = _cache_key() + username.encode() + b"\0" + stored_hash.encode()
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 100_000).hex()
+
+
+def _hash_marker(stored_hash: str) -> str:
+    # which stored hash a cached login was made against, without keeping the hash
+    return hmac.new(_cache_key(), stored_hash.encode(), hashlib.sha256).hexdigest()
+
+
+def _cached_login(username: str, stored_hash: str, max_age: float):
+    """The cached login, dropped if the password hash changed since it was saved."""
+    name = f"login:{username}"
+    cached = _cache_get(name, max_age)
+    if cached and stored_hash and cached.get("pw") != _hash_marker(stored_hash):
+        _cache_drop(name)
+        return None
+    return cached
+
 
 #  LOGIN + ENTITLEMENT CHECK
 
 def login(username: str, password: str):
-    """Call /api/login and return user dict or None."""
+    """Call /api/login and return user dict or None (offline: last login within the grace window)."""
     url = f"{API_BASE}/api/login"
-    resp = requests.post(url, json={"username": username, "password": password})
+    try:
+        resp = get_session().post(url, json={"username": username, "password": password},
+                                  timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        stored_hash = _stored_password_hash(username)
+        cached = _cached_login(username, stored_hash, OFFLINE_GRACE)
+        if cached and hmac.compare_digest(cached["tag"], _password_tag(username, password, stored_hash)):
+            print("Store unreachable, using cached login.")
+            return cached["user"]
+        print("Login failed:", e)
+        return None
     if resp.status_code != 200:
         print("Login failed:", resp.text)
         return None
-    return resp.json()
+    user = resp.json()
+    # the server just checked the password; the PBKDF2 tag is only recomputed
+    # when the cached login is missing, for another user, a day old or made
+    # against another password hash. Without a local store DB a password change
+    # can't be seen here, so the tag is always recomputed.
+    stored_hash = _stored_password_hash(username)
+    cached = _cached_login(username, stored_hash, ENTITLEMENT_TTL)
+    if not (stored_hash and cached and cached.get("user") == user):
+        _cache_put(f"login:{username}", {"user": user, "tag": _password_tag(username, password, stored_hash),
+                                         "pw": _hash_marker(stored_hash)})
+    return user
+
+
+def check_entitlement_onchain(user_id: int, game_id: int):
+    """Verify the purchase against the local chain index; None if it can't be decided locally."""
+    if not (os.path.exists(STORE_DB) and os.path.exists(CHAIN_INDEX_DB)):
+        return None
+    store = StorePool(STORE_DB, size=1, readonly=True)
+    try:
+        row = store.purchase(user_id, game_id)
+    finally:
+        store.close()
+    if row is None or not row[1]:
+        return None
+    tx_hash, wallet, game_name = row
+
+    index = ChainIndex(CHAIN_INDEX_DB, BLOCKS_DIR, readonly=True)
+    try:
+        if index.is_stale():
+            return None  # blocks arrived since the miner last updated it
+        paid = index.paid_to(tx_hash, wallet)
+    finally:
+        index.close()
+    if paid is None:
+        return {"authorized": False, "reason": "Purchase transaction not found on chain."}
+    return {"authorized": True, "gameName": game_name or f"Game #{game_id}",
+            "txHash": tx_hash, "height": paid["height"], "source": "chain"}
 
 
 def check_entitlement(user_id: int, game_id: int):
-    """Call /api/entitlement/:userId/:gameId and return JSON."""
+    """Return the cached license if fresh, else verify on chain, else call /api/entitlement/:userId/:gameId."""
+    name = f"entitlement:{user_id}:{game_id}"
+    cached = _cache_get(name, ENTITLEMENT_TTL)
+    if cached:
+        return cached
+
+    ent = check_entitlement_onchain(user_id, game_id)
+    if ent is not None:
+        if ent.get("authorized"):
+            _cache_put(name, ent)
+        return ent
+
     url = f"{API_BASE}/api/entitlement/{user_id}/{game_id}"
-    resp = requests.get(url)
+    try:
+        resp = get_session().get(url, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        cached = _cache_get(name, OFFLINE_GRACE)
+        if cached:
+            print("Store unreachable, using cached license.")
+            return cached
+        print("Entitlement check failed:", e)
+        return {"authorized": False, "reason": "Store unreachable"}
     if resp.status_code != 200:
         print("Entitlement check failed:", resp.text)
         return {"authorized": False, "reason": "Server error"}
 
-    return resp.json()
+    ent = resp.json()
+    if ent.get("authorized"):
+        _cache_put(name, ent)  # only grants are cached; a denial is re-checked next launch
+    return ent
 
 
 #  THE GAME 
@@ -1,10 +1,7 @@
 import json
 import hashlib
 import time
-import uuid
 import os
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
 
 
 '''
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from typing import List, Dict, Any
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import txfiles
+
+
+# Archiving processed transactions after a block: files per second.
+#
+#   python benchmarks/bench_archive.py [--files 100 1000 10000] [--repeat 3]
+#
+# Compares the old per-file shutil.move of every included pending file into
+# ProcessedTransactions/ with Block.archive_included(): one segment file per
+# block plus a single sweep deleting the pending files, with and without the
+# fsyncs (FSYNC=0). Pending files hold wallet-sized txs; nothing is validated.
+# Only the archiving is timed, not writing the pending files.
+
+
+def fake_tx(i: int) -> Dict[str, Any]:
+    body = {"timestamp": 1_700_000_000 + i,
+            "inputs": [{"prev_txid": hashlib.sha256(str(i).encode()).hexdigest(), "prev_index": 0}],
+            "outputs": [{"address": hashlib.sha256(b"a%d" % i).hexdigest(), "value": 10},
+                        {"address": hashlib.sha256(b"b%d" % i).hexdigest(), "value": 90}]}
+    return {"txid": hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest(), "body": body,
+            "inputs": [{**body["inputs"][0], "pubkey": "-----BEGIN PUBLIC KEY-----\n" + "A" * 392 +
+                        "\n-----END PUBLIC KEY-----\n", "signature": "ab" * 256}]}
+
+
+def fill_pending(Block, n: int) -> List[str]:
+    files = []
+    for i in range(n):
+        tx = fake_tx(i)
+        with open(txfiles.path_for(Block.PENDING_DIR, tx["txid"], create=True), "w") as f:
+            json.dump(tx, f, indent=2)
+        files.append(txfiles.rel_path(tx["txid"] + ".json"))
+    return files
+
+
+def clear(Block) -> None:
+    for d in (Block.PENDING_DIR, Block.PROCESSED_DIR):
+        shutil.rmtree(d)
+        os.makedirs(d)
+
+
+def per_file_move(Block, files: List[str]) -> None:
+    # what create_block() used to do
+    for fname in files:
+        shutil.move(os.path.join(Block.PENDING_DIR, fname),
+                    os.path.join(Block.PROCESSED_DIR, os.path.basename(fname)))
+
+
+def segment(Block, files: List[str]) -> None:
+    Block.archive_included(hashlib.sha256(files[0].encode()).hexdigest(), 1, files)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, nargs="+", default=[100, 1000, 10_000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="bench_archive_")
+    os.chdir(work)  # Block.py works on ./PendingTransactions, ./ProcessedTransactions
+    os.environ["CHAIN_INDEX"] = ""
+    import Block
+    Block.make_dirs()
+    try:
+        strategies = [("per_file_move", per_file_move, True), ("segment", segment, True),
+                      ("segment_nofsync", segment, False)]
+        print(f"{'files':>7} {'strategy':18} {'files/s':>12} {'ms':>10}")
+        for n in args.files:
+            for name, fn, fsync in strategies:
+                Block.FSYNC = fsync
+                best = float("inf")
+                for _ in range(args.repeat):
+                    clear(Block)
+                    files = fill_pending(Block, n)
+                    t0 = time.perf_counter()
+                    fn(Block, files)
+                    best = min(best, time.perf_counter() - t0)
+                    assert not txfiles.list_sorted(Block.PENDING_DIR)
+                print(f"{n:7d} {name:18} {n / best:12.0f} {best * 1000:10.2f}")
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import argparse
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+
+import node
+from chainstate import canonical, merkle_root
+
+
+# Block propagation between two local nodes: compact vs full relay.
+#
+#   python benchmarks/bench_compact.py [--txs 500] [--missing 0.05]
+#
+# Both nodes share a mempool of --txs signed transactions (minus a --missing
+# fraction that only the miner has). The miner then finds a block with all of
+# them and we measure the bytes it sends and the time until the peer's tip moves.
+
+
+def make_fixture(n_txs: int):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pub = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                        serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    addr = hashlib.sha256(pub.encode()).hexdigest()
+    cb_body = {"timestamp": 0, "inputs": [], "outputs": [{"address": addr, "value": 10} for _ in range(n_txs)]}
+    coinbase = {"txid": hashlib.sha256(canonical(cb_body).encode()).hexdigest(), "body": cb_body, "inputs": []}
+    genesis = make_block(0, "NA", [coinbase])
+    txs = []
+    for i in range(n_txs):
+        body = {"timestamp": i, "inputs": [{"prev_txid": coinbase["txid"], "prev_index": i}],
+                "outputs": [{"address": addr, "value": 9}]}
+        sig = key.sign(canonical(body).encode(), padding.PKCS1v15(), hashes.SHA256()).hex()
+        txs.append({"txid": hashlib.sha256(canonical(body).encode()).hexdigest(), "body": body,
+                    "inputs": [{"prev_txid": coinbase["txid"], "prev_index": i, "pubkey": pub, "signature": sig}]})
+    return genesis, txs
+
+
+def make_block(height: int, prev: str, body):
+    header = {"height": height, "timestamp": int(time.time()), "previousblock": prev,
+              "merkle_root": merkle_root([tx["txid"] for tx in body]),
+              "hash": hashlib.sha256(json.dumps(body, separators=(',', ':')).encode()).hexdigest()}
+    return {"header": header, "body": body}
+
+
+def write(path: str, obj) -> None:
+    with open(path, "w") as f:
+        json.dump(obj, f, indent=2)
+
+
+async def run_once(work: str, genesis, txs, missing: float, compact: bool) -> dict:
+    node.COMPACT_BLOCKS = compact
+    gen_hash = hashlib.sha256(canonical(genesis["header"]).encode()).hexdigest()
+    n_missing = int(len(txs) * missing)
+    for name, mempool in (("miner", txs), ("peer", txs[n_missing:])):
+        d = os.path.join(work, name)
+        os.makedirs(os.path.join(d, "Blocks"))
+        os.makedirs(os.path.join(d, "PendingTransactions"))
+        write(os.path.join(d, "Blocks", gen_hash + ".json"), genesis)
+        for tx in mempool:
+            write(os.path.join(d, "PendingTransactions", tx["txid"] + ".json"), tx)
+
+    miner = node.Node(os.path.join(work, "miner"))
+    peer = node.Node(os.path.join(work, "peer"))
+    await miner.start()
+    await peer.start()
+    await peer.connect("127.0.0.1", miner.port)
+    while not miner.peers or not miner.peers[0].compact == compact:
+        await asyncio.sleep(0.01)
+    link = miner.peers[0]
+    link.bytes_sent.clear()
+
+    blk = make_block(1, gen_hash, txs)
+    bhash = hashlib.sha256(canonical(blk["header"]).encode()).hexdigest()
+    write(os.path.join(work, "miner", "Blocks", bhash + ".json"), blk)
+    t0 = time.perf_counter()
+    await miner.poll_local_once()
+    while peer.state.tip is None or peer.state.tip.hash != bhash:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - t0
+    sent = dict(link.bytes_sent)
+    await peer.stop()
+    await miner.stop()
+    return {"compact": compact, "txs": len(txs), "missing": n_missing,
+            "bytes": sum(sent.values()), "by_type": sent, "seconds": elapsed}
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--txs", type=int, default=500)
+    ap.add_argument("--missing", type=float, default=0.05, help="fraction of txs the peer lacks")
+    args = ap.parse_args(argv)
+
+    genesis, txs = make_fixture(args.txs)
+    results = []
+    for compact in (False, True):
+        work = tempfile.mkdtemp(prefix="bench_compact_")
+        try:
+            res = asyncio.run(run_once(work, genesis, txs, args.missing, compact))
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        results.append(res)
+        mode = "compact" if compact else "full   "
+        print(f"{mode}: {res['bytes']:>10} bytes  {res['seconds'] * 1000:8.1f} ms  {res['by_type']}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Callable, Any, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import jsonio
+from gen_chain import generate
+
+
+# JSON parse/serialize throughput on generated blocks: stdlib json vs jsonio
+# (orjson when installed).
+#
+#   python benchmarks/bench_json.py [--blocks 50] [--txs-per-block 200] [--repeat 5] [--chain DIR]
+#
+# Times, per backend, over every block file of a gen_chain.py chain:
+#   loads      block file bytes -> dict         (MB/s)
+#   canonical  every tx body, sorted+compact     (objects/s, the txid input)
+#   compact    every block body, insertion order (MB/s, the header["hash"] input)
+#   indent2    every block as written to Blocks/ (MB/s)
+# and first asserts jsonio's output is byte-identical to the stdlib's on all of it.
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(blocks_dir: str, repeat: int) -> None:
+    texts: List[bytes] = []
+    for fname in sorted(os.listdir(blocks_dir)):
+        if fname.endswith(".json"):
+            with open(os.path.join(blocks_dir, fname), "rb") as f:
+                texts.append(f.read())
+    blocks = [json.loads(t) for t in texts]
+    bodies = [tx["body"] for b in blocks for tx in b["body"]]
+    text_mb = sum(len(t) for t in texts) / 1e6
+    compact_mb = sum(len(json.dumps(b["body"], separators=(',', ':'))) for b in blocks) / 1e6
+    indent_mb = sum(len(json.dumps(b, indent=2)) for b in blocks) / 1e6
+
+    for b in blocks:
+        assert jsonio.compact(b["body"]) == json.dumps(b["body"], separators=(',', ':'))
+        assert jsonio.dumps(b, indent=2) == json.dumps(b, indent=2)
+        assert jsonio.loads(json.dumps(b)) == b
+    for body in bodies:
+        assert jsonio.canonical(body) == json.dumps(body, separators=(',', ':'), sort_keys=True)
+    print(f"{len(blocks)} blocks, {len(bodies)} txs, {text_mb:.1f} MB on disk: "
+          f"jsonio ({jsonio.BACKEND}) output byte-identical to json")
+
+    cases = [
+        ("loads", text_mb, "MB/s",
+         lambda: [json.loads(t) for t in texts], lambda: [jsonio.loads(t) for t in texts]),
+        ("canonical", len(bodies), "obj/s",
+         lambda: [json.dumps(b, separators=(',', ':'), sort_keys=True) for b in bodies],
+         lambda: [jsonio.canonical(b) for b in bodies]),
+        ("compact", compact_mb, "MB/s",
+         lambda: [json.dumps(b["body"], separators=(',', ':')) for b in blocks],
+         lambda: [jsonio.compact(b["body"]) for b in blocks]),
+        ("indent2", indent_mb, "MB/s",
+         lambda: [json.dumps(b, indent=2) for b in blocks], lambda: [jsonio.dumps(b, indent=2) for b in blocks]),
+    ]
+    print(f"{'op':10} {'json':>14} {'jsonio':>14} {'speedup':>8}")
+    for name, amount, unit, std, fast in cases:
+        t_std, t_fast = best_of(std, repeat), best_of(fast, repeat)
+        print(f"{name:10} {amount / t_std:9.1f} {unit:5} {amount / t_fast:9.1f} {unit:5} {t_std / t_fast:7.1f}x")
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--blocks", type=int, default=50)
+    ap.add_argument("--txs-per-block", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--chain", default=None, help="use an existing gen_chain.py output dir")
+    args = ap.parse_args(argv)
+
+    work = args.chain or tempfile.mkdtemp(prefix="bench_json_")
+    try:
+        if not args.chain:
+            generate(work, args.blocks, args.txs_per_block, n_wallets=4, key_size=1024, quiet=True)
+        run(os.path.join(work, "Blocks"), args.repeat)
+    finally:
+        if not args.chain:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
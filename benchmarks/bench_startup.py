@@ -0,0 +1,128 @@
+import io
+import os
+import sys
+import contextlib
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import List, Dict, Any, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from gen_chain import generate
+import chain_index
+
+
+# Startup cost of the wallet and transaction CLIs, which scripts launch thousands of times.
+#
+#   python benchmarks/bench_startup.py [--blocks 20] [--repeat 10] [--wallet PATH] [--transaction PATH]
+#
+# Runs each command as a fresh process against a gen_chain.py chain and reports the
+# best wall time plus the import time from `python -X importtime`:
+#   wallet_balance   wallet.py with no drafts: balance + history, nothing to sign
+#   wallet_sign      wallet.py with one draft to sign (loads cryptography and the key)
+#   transaction      Transaction.py writing one draft (answers fed on stdin)
+# --wallet / --transaction take other versions of the scripts, e.g. from `git show`,
+# to compare. Exits 1 if a command that signs nothing imports cryptography.
+
+HEAVY = "cryptography"
+
+
+def import_profile(stderr: str) -> Dict[str, Any]:
+    # -X importtime lines: "import time: self [us] | cumulative | package", nesting by indent
+    total, mods, heavy = 0, [], False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip().split(".")[0] == HEAVY:
+            heavy = True
+        if not name[1:].startswith(" "):  # top level
+            total += int(cumulative)
+            mods.append((int(cumulative), name.strip()))
+    mods.sort(reverse=True)
+    return {"import_ms": total / 1000, "top": mods[:3], "heavy": heavy}
+
+
+def run_once(argv: List[str], cwd: str, stdin: Optional[str], importtime: bool) -> subprocess.CompletedProcess:
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + argv
+    # the wallet imports txfiles and wallet_chain from its parent dir, here the repo
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    proc = subprocess.run(cmd, cwd=cwd, input=stdin, capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise SystemExit(f"{' '.join(argv)} failed:\n{proc.stderr[-2000:]}")
+    return proc
+
+
+def setup(work: str, blocks: int, wallet_src: str) -> None:
+    generate(work, blocks, 20, n_wallets=2, key_size=1024, quiet=True)
+    # the miner keeps chain_index.db current; the wallets read balances from it
+    with contextlib.redirect_stdout(io.StringIO()):
+        chain_index.main(["--blocks-dir", os.path.join(work, "Blocks"),
+                          "--db", os.path.join(work, "chain_index.db")])
+    os.makedirs(os.path.join(work, "wallet_A"))
+    shutil.copy(wallet_src, os.path.join(work, "wallet_A", "wallet.py"))
+    shutil.copy(os.path.join(work, "wallet_W000", "private_key.pem"), os.path.join(work, "wallet_A", "private_key.pem"))
+    with open(os.path.join(work, "addresses.json")) as f:
+        book = json.load(f)
+    book["B"] = book["W001"]
+    with open(os.path.join(work, "addresses.json"), "w") as f:
+        json.dump(book, f, indent=2)
+
+
+def write_draft(work: str) -> None:
+    d = os.path.join(work, "tx_requests")
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, "bench_draft.json"), "w") as f:
+        json.dump({"type": "draft", "timestamp": time.time(), "from": "a", "sender_wallet": "A",
+                   "to": "b", "receiver": "B", "amount": "1"}, f)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--blocks", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--wallet", default=os.path.join(ROOT, "wallet_A", "wallet.py"))
+    ap.add_argument("--transaction", default=os.path.join(ROOT, "Transaction.py"))
+    args = ap.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        setup(work, args.blocks, args.wallet)
+        wallet = [os.path.join(work, "wallet_A", "wallet.py")]
+        tx_answers = "a\nA\nb\nB\n1\n"
+        run_once(wallet, work, None, False)  # first run: creates dirs and any key cache
+        cases = [("wallet_balance", wallet, None, None, False),
+                 ("wallet_sign", wallet, None, write_draft, True),
+                 ("transaction", [os.path.abspath(args.transaction)], tx_answers, None, False)]
+
+        failed = False
+        print(f"{'command':16} {'wall ms':>9} {'import ms':>10}  {HEAVY:12} top imports (cumulative ms)")
+        for name, argv_, stdin, before, signs in cases:
+            best = float("inf")
+            for _ in range(args.repeat):
+                if before:
+                    before(work)
+                t0 = time.perf_counter()
+                run_once(argv_, work, stdin, False)
+                best = min(best, time.perf_counter() - t0)
+            if before:
+                before(work)
+            prof = import_profile(run_once(argv_, work, stdin, True).stderr)
+            top = ", ".join(f"{m} {us / 1000:.1f}" for us, m in prof["top"])
+            print(f"{name:16} {best * 1000:9.1f} {prof['import_ms']:10.1f}  "
+                  f"{'yes' if prof['heavy'] else 'no':12} {top}")
+            if prof["heavy"] and not signs:
+                print(f"  {name} signs nothing but imports {HEAVY}")
+                failed = True
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
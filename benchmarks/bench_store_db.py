@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import store_db
+
+
+# game_store.db hot lookups, before and after store_db's migrations.
+#
+#   python benchmarks/bench_store_db.py [--purchases 1000000] [--lookups 20000]
+#
+# Copies the schema of the repo's game_store.db into a temp database, fills it
+# with generated users, games, purchases (user_games + transactions), friends
+# and shares, then times random entitlement/library/friend/share/tx lookups on
+# the bare schema and again through a StorePool after migration.
+
+
+def fake_hash(i: int, kind: str) -> str:
+    return "0x" + hashlib.sha256(f"{kind}{i}".encode()).hexdigest()
+
+
+def create_schema(path: str) -> None:
+    src = sqlite3.connect(os.path.join(ROOT, "game_store.db"))
+    tables = [sql for name, sql in src.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name != 'sqlite_sequence'")]
+    src.close()
+    dst = sqlite3.connect(path)
+    for sql in tables:
+        dst.execute(sql)
+    dst.commit()
+    dst.close()
+
+
+def populate(path: str, n_users: int, n_games: int, n_purchases: int, seed: int = 1) -> None:
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA synchronous=OFF")
+    with db:
+        db.executemany("INSERT INTO users (id, username, wallet_address) VALUES (?, ?, ?)",
+                       ((u, f"user{u}", fake_hash(u, "wallet")[:42]) for u in range(1, n_users + 1)))
+        db.executemany("INSERT INTO games (id, name) VALUES (?, ?)",
+                       ((g, f"Game {g}") for g in range(1, n_games + 1)))
+        purchases = [(rng.randint(1, n_users), rng.randint(1, n_games), fake_hash(i, "tx"))
+                     for i in range(n_purchases)]
+        db.executemany("INSERT INTO user_games (user_id, game_id, token_id, acquired_via, tx_hash) "
+                       "VALUES (?, ?, ?, 'purchase', ?)",
+                       ((u, g, str(i), h) for i, (u, g, h) in enumerate(purchases)))
+        db.executemany("INSERT INTO transactions (user_id, game_id, token_id, to_address, type, tx_hash) "
+                       "VALUES (?, ?, ?, ?, 'purchase', ?)",
+                       ((u, g, str(i), fake_hash(u, "wallet")[:42], h) for i, (u, g, h) in enumerate(purchases)))
+        db.executemany("INSERT INTO friends (user_id, friend_id) VALUES (?, ?)",
+                       ((rng.randint(1, n_users), rng.randint(1, n_users)) for _ in range(n_users * 5)))
+        db.executemany("INSERT INTO game_shares (owner_id, friend_id, game_id, share_hash) VALUES (?, ?, ?, ?)",
+                       ((rng.randint(1, n_users), rng.randint(1, n_users), rng.randint(1, n_games),
+                         fake_hash(i, "share")) for i in range(n_users)))
+    db.close()
+
+
+def workload(n_users: int, n_games: int, n_purchases: int, lookups: int, seed: int = 2):
+    rng = random.Random(seed)
+    return [(rng.randint(1, n_users), rng.randint(1, n_games), fake_hash(rng.randrange(n_purchases), "tx"),
+             fake_hash(rng.randrange(n_users), "share")) for _ in range(lookups)]
+
+
+def time_queries(run, work) -> dict:
+    out = {}
+    for name, fn in run.items():
+        t0 = time.perf_counter()
+        for args in work:
+            fn(*args)
+        secs = time.perf_counter() - t0
+        out[name] = {"lookups": len(work), "seconds": secs, "us_per_lookup": secs / len(work) * 1e6}
+    return out
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--purchases", type=int, default=1_000_000)
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--games", type=int, default=500)
+    ap.add_argument("--lookups", type=int, default=20_000)
+    ap.add_argument("--baseline-lookups", type=int, default=200,
+                    help="lookups on the unindexed schema (full scans, keep it small)")
+    args = ap.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="bench_store_")
+    try:
+        path = os.path.join(work_dir, "game_store.db")
+        create_schema(path)
+        t = time.perf_counter()
+        populate(path, args.users, args.games, args.purchases)
+        print(f"generated {args.purchases} purchases in {time.perf_counter() - t:.1f}s")
+        work = workload(args.users, args.games, args.purchases, args.lookups)
+
+        bare = sqlite3.connect(path)
+        base = time_queries({
+            "entitlement": lambda u, g, h, s: bare.execute(store_db.SQL_ENTITLEMENT, (u, g)).fetchone(),
+            "library": lambda u, g, h, s: bare.execute(store_db.SQL_LIBRARY, (u,)).fetchall(),
+            "friends": lambda u, g, h, s: bare.execute(store_db.SQL_FRIENDS, (u,)).fetchall(),
+            "share": lambda u, g, h, s: bare.execute(store_db.SQL_SHARE, (s,)).fetchone(),
+            "tx_by_hash": lambda u, g, h, s: bare.execute(store_db.SQL_TX_BY_HASH, (h,)).fetchone(),
+        }, work[:args.baseline_lookups])
+        bare.close()
+
+        t = time.perf_counter()
+        pool = store_db.StorePool(path)
+        migrate_secs = time.perf_counter() - t
+        indexed = time_queries({
+            "entitlement": lambda u, g, h, s: pool.entitlement(u, g),
+            "library": lambda u, g, h, s: pool.library(u),
+            "friends": lambda u, g, h, s: pool.friends(u),
+            "share": lambda u, g, h, s: pool.share(s),
+            "tx_by_hash": lambda u, g, h, s: pool.transaction(h),
+        }, work)
+        pool.close()
+
+        print(f"migration (index build): {migrate_secs:.1f}s")
+        for name in base:
+            b, i = base[name]["us_per_lookup"], indexed[name]["us_per_lookup"]
+            print(f"{name:12s} {b:12.1f} us -> {i:8.1f} us  ({b / i:,.0f}x)")
+        print(json.dumps({"purchases": args.purchases, "migration_seconds": migrate_secs,
+                          "baseline": base, "indexed": indexed}))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
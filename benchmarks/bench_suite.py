@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+import importlib.util
+from typing import List, Dict, Any, Callable, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+import txfiles
+from gen_chain import generate
+
+
+# Miner / wallet / validation hot paths on a generated chain.
+#
+#   python benchmarks/bench_suite.py [--blocks 200] [--txs-per-block 20] [--repeat 5]
+#                                    [--chain DIR] [--out results.json]
+#
+# Builds a chain with gen_chain.py (or reuses --chain), then times:
+#   merkle_root, verify_signature, validate_transaction by input count,
+#   load_blocks + build_utxos, get_last_block (cold load and warm),
+#   process_pending_transactions + create_block end to end over the backlog,
+#   wallet balance_of and create_signed_transaction.
+# Results (per-call seconds: mean/min/max/stdev) go to --out as JSON together
+# with the git commit and chain parameters, so runs can be diffed across versions.
+
+
+def measure(fn: Callable[[], Any], repeat: int, number: int = 1,
+            setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    return {"mean": statistics.mean(times), "min": min(times), "max": max(times),
+            "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "repeat": repeat, "number": number}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_wallet(work: str, label: str):
+    # a copy of wallet_A/wallet.py living in the work dir, so its SHARED paths
+    # (Blocks/, PendingTransactions/, tx_requests/) point at the generated chain
+    wdir = os.path.join(work, "wallet_A")
+    os.makedirs(wdir, exist_ok=True)
+    shutil.copy(os.path.join(ROOT, "wallet_A", "wallet.py"), os.path.join(wdir, "wallet.py"))
+    shutil.copy(os.path.join(work, f"wallet_{label}", "private_key.pem"), os.path.join(wdir, "private_key.pem"))
+    spec = importlib.util.spec_from_file_location("bench_wallet", os.path.join(wdir, "wallet.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def spend_tx(Block, priv, pub_pem: str, address: str, utxos: Dict[str, Dict[str, Any]], n_inputs: int):
+    # a wallet-format tx spending n_inputs of address's utxos, or None if it has fewer
+    mine = [k for k, u in utxos.items() if u["address"] == address][:n_inputs]
+    if len(mine) < n_inputs:
+        return None
+    inputs = [{"prev_txid": k.split(":")[0], "prev_index": int(k.split(":")[1])} for k in mine]
+    total = sum(utxos[k]["value"] for k in mine)
+    body = {"timestamp": int(time.time()), "inputs": inputs, "outputs": [{"address": address, "value": total}]}
+    sig = priv.sign(Block.canonical(body).encode(), padding.PKCS1v15(), hashes.SHA256()).hex()
+    return {"txid": hashlib.sha256(Block.canonical(body).encode()).hexdigest(), "body": body,
+            "inputs": [{**i, "pubkey": pub_pem, "signature": sig} for i in inputs]}
+
+
+def run(work: str, repeat: int) -> List[Dict[str, Any]]:
+    results = []
+
+    def record(name: str, stats: Dict[str, float], **params) -> None:
+        results.append({"name": name, "params": params, **stats})
+        label = name + "".join(f" {k}={v}" for k, v in params.items())
+        print(f"{label:40s} {stats['mean'] * 1000:10.3f} ms  (min {stats['min'] * 1000:.3f})")
+
+    os.chdir(work)  # Block.py works on ./Blocks, ./PendingTransactions
+    os.environ["CHAIN_INDEX"] = ""
+    os.environ["ASSUME_VALID"] = os.path.join(work, "no-checkpoint.json")
+    import Block
+
+    book = json.load(open(os.path.join(work, "addresses.json")))
+    label = sorted(book)[0]
+    with open(os.path.join(work, f"wallet_{label}", "private_key.pem"), "rb") as f:
+        priv = serialization.load_pem_private_key(f.read(), password=None)
+    pub_pem, address = book[label]["pubkey_pem"], book[label]["address"]
+
+    for n in (10, 100, 1000, 10_000):
+        txids = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(n)]
+        record("merkle_root", measure(lambda: Block.merkle_root(txids), repeat, max(1, 10_000 // n)), txids=n)
+
+    state = Block.get_chain_state()
+    utxos = dict(state.utxos)
+    tx = spend_tx(Block, priv, pub_pem, address, utxos, 1)
+    data = Block.canonical(tx["body"]).encode()
+    record("verify_signature", measure(
+        lambda: Block.verify_signature(pub_pem, data, tx["inputs"][0]["signature"]), repeat, 100))
+
+    for k in (1, 2, 4, 8, 16):
+        tx = spend_tx(Block, priv, pub_pem, address, utxos, k)
+        if tx is None:
+            print(f"validate_transaction inputs={k}: skipped, wallet has fewer utxos")
+            continue
+        assert Block.validate_transaction(tx, utxos)
+        record("validate_transaction", measure(lambda: Block.validate_transaction(tx, utxos), repeat, 20), inputs=k)
+
+    blocks = Block.load_blocks()
+    record("load_blocks", measure(Block.load_blocks, repeat), blocks=len(blocks))
+    record("build_utxos", measure(lambda: Block.build_utxos(blocks), repeat), blocks=len(blocks))
+
+    def cold():
+        Block.chain_state = None
+    record("get_last_block_cold", measure(Block.get_last_block, repeat, setup=cold), blocks=len(blocks))
+    Block.get_last_block()
+    record("get_last_block_warm", measure(Block.get_last_block, repeat, 1000), blocks=len(blocks))
+
+    # end to end over the generated backlog; each repeat starts from the same state
+    base_blocks = set(os.listdir(Block.BLOCKS_DIR))
+    backlog = os.path.join(work, "backlog")
+    if not os.path.exists(backlog):
+        shutil.copytree(Block.PENDING_DIR, backlog)
+    n_pending = len(txfiles.list_sorted(backlog))
+
+    def reset_miner():
+        for fname in set(os.listdir(Block.BLOCKS_DIR)) - base_blocks:
+            os.remove(os.path.join(Block.BLOCKS_DIR, fname))
+        for d in (Block.PENDING_DIR, Block.PROCESSED_DIR):
+            shutil.rmtree(d)
+        shutil.copytree(backlog, Block.PENDING_DIR)
+        os.makedirs(os.path.join(Block.PROCESSED_DIR, "invalid"))
+        Block.chain_state = None
+        Block.get_chain_state()
+
+    def mine_once():
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            Block.process_pending_transactions()
+            Block.create_block()
+    record("create_block_e2e", measure(mine_once, repeat, setup=reset_miner), pending=n_pending)
+    reset_miner()
+
+    wallet = load_wallet(work, label)
+    record("wallet_balance_of", measure(lambda: wallet.balance_of(address), repeat), blocks=len(blocks))
+    other = book[sorted(book)[-1]]["address"]
+    record("wallet_create_signed_transaction", measure(
+        lambda: wallet.create_signed_transaction(priv, pub_pem, address, other, 1), repeat),
+        blocks=len(blocks))
+    return results
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--blocks", type=int, default=200)
+    ap.add_argument("--txs-per-block", type=int, default=20)
+    ap.add_argument("--wallets", type=int, default=4)
+    ap.add_argument("--pending", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--chain", default=None, help="reuse a gen_chain.py output dir (it is modified)")
+    ap.add_argument("--out", default=None, help="write JSON results here")
+    args = ap.parse_args(argv)
+    out = os.path.abspath(args.out) if args.out else None
+
+    work = args.chain or tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        if not args.chain:
+            t = time.perf_counter()
+            generate(work, args.blocks, args.txs_per_block, n_wallets=args.wallets,
+                     pending=args.pending, quiet=True)
+            print(f"generated chain in {time.perf_counter() - t:.1f}s")
+        results = run(os.path.abspath(work), args.repeat)
+    finally:
+        os.chdir(ROOT)
+        if not args.chain:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {"commit": git_commit(), "python": platform.python_version(),
+              "machine": platform.machine(), "timestamp": int(time.time()),
+              "chain": {"blocks": args.blocks, "txs_per_block": args.txs_per_block,
+                        "wallets": args.wallets, "pending": args.pending, "reused": bool(args.chain)},
+              "results": results}
+    if out:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {out}")
+    else:
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import node
+from gen_chain import generate
+
+
+# Headers-first initial block download between local nodes.
+#
+#   python benchmarks/bench_sync.py [--blocks 50000] [--sources 3] [--txs-per-block 0]
+#
+# Generates a chain with gen_chain.py (empty blocks by default, so only the
+# structure is measured), starts --sources node.py processes that each hold a copy,
+# then syncs an empty node from all of them and reports how long the header
+# phase and the body phase took.
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"node on port {port} did not start")
+
+
+async def sync(target_dir: str, ports, tip: str, n_blocks: int) -> dict:
+    fresh = node.Node(target_dir)
+    await fresh.start()
+    t0 = time.perf_counter()
+    for port in ports:
+        await fresh.connect("127.0.0.1", port)
+    t_headers = None
+    while fresh.state.tip is None or fresh.state.tip.hash != tip:
+        await asyncio.sleep(0.05)
+        best = fresh.state.best_header()
+        if t_headers is None and best is not None and best.hash == tip:
+            t_headers = time.perf_counter() - t0
+    total = time.perf_counter() - t0
+    await fresh.stop()
+    return {"blocks": n_blocks, "sources": len(ports), "headers_seconds": t_headers,
+            "bodies_seconds": total - (t_headers or 0), "total_seconds": total,
+            "blocks_per_sec": n_blocks / total}
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--blocks", type=int, default=50_000)
+    ap.add_argument("--sources", type=int, default=3)
+    ap.add_argument("--txs-per-block", type=int, default=0)
+    ap.add_argument("--keep", action="store_true", help="keep the temp dir")
+    args = ap.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="bench_sync_")
+    procs = []
+    try:
+        t = time.perf_counter()
+        tip = generate(os.path.join(work, "seed"), args.blocks - 1, args.txs_per_block,
+                       pending=0, quiet=True)["tip"]
+        print(f"generated {args.blocks} blocks in {time.perf_counter() - t:.1f}s")
+
+        ports = []
+        for i in range(args.sources):
+            d = os.path.join(work, f"src{i}")
+            shutil.copytree(os.path.join(work, "seed"), d)
+            port = free_port()
+            procs.append(subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, "node.py"), "--dir", d, "--port", str(port)],
+                cwd=d, stdout=subprocess.DEVNULL))
+            ports.append(port)
+        for port in ports:
+            wait_for_port(port, timeout=600)
+
+        res = asyncio.run(sync(os.path.join(work, "fresh"), ports, tip, args.blocks))
+        print(f"headers: {res['headers_seconds']:.2f}s  bodies: {res['bodies_seconds']:.2f}s  "
+              f"total: {res['total_seconds']:.2f}s  ({res['blocks_per_sec']:.0f} blocks/s "
+              f"from {res['sources']} source(s))")
+        print(json.dumps(res))
+    finally:
+        for p in procs:
+            p.terminate()
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+from multiprocessing import Pool
+from typing import List, Dict, Any, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+
+from chainstate import canonical, merkle_root, block_hash
+import txfiles
+
+
+# Synthetic chain + workload generator in the real on-disk formats.
+#
+#   python benchmarks/gen_chain.py OUT [--blocks 1000] [--txs-per-block 50] [--inputs 1]
+#                                      [--outputs 2] [--wallets 10] [--pending 1000]
+#
+# OUT gets the same layout the miner and wallets use:
+#   OUT/Blocks/<sha256(canonical(header))>.json   genesis coinbase + --blocks blocks
+#   OUT/PendingTransactions/ab/cd/<txid>.json     --pending signed txs spending the tip utxos
+#   OUT/ProcessedTransactions/, OUT/addresses.json, OUT/wallet_<label>/private_key.pem
+#
+# Transactions are built like wallet.create_signed_transaction(): inputs
+# {prev_txid, prev_index}, one RSA PKCS1v15/SHA256 signature over canonical(body)
+# repeated on every input with the pubkey, txid = sha256(canonical(body)).
+# Blocks are built like Block.create_block(). Every tx is valid against the
+# chain, so the miner, validate_chain.py and node.py accept the result. Outputs
+# become spendable from the next block on. Signing dominates the run time and
+# is spread over --workers processes. Use --key-size 1024 for quick runs.
+
+GENESIS_VALUE = 1_000_000
+BLOCK_SPACING = 10
+BASE_TIME = 1_700_000_000
+
+_keys: List[Any] = []
+
+
+def _init_signer(pems: List[bytes]) -> None:
+    global _keys
+    _keys = [serialization.load_pem_private_key(p, password=None) for p in pems]
+
+
+def _sign(job: Tuple[int, bytes]) -> str:
+    wallet, data = job
+    return _keys[wallet].sign(data, padding.PKCS1v15(), hashes.SHA256()).hex()
+
+
+def make_wallets(out: str, n: int, key_size: int) -> List[Dict[str, Any]]:
+    wallets = []
+    book = {}
+    for i in range(n):
+        label = f"W{i:03d}"
+        priv = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+        pem = priv.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                 serialization.NoEncryption())
+        pub_pem = priv.public_key().public_bytes(serialization.Encoding.PEM,
+                                                 serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        address = hashlib.sha256(pub_pem.encode()).hexdigest()
+        os.makedirs(os.path.join(out, f"wallet_{label}"), exist_ok=True)
+        with open(os.path.join(out, f"wallet_{label}", "private_key.pem"), "wb") as f:
+            f.write(pem)
+        book[label] = {"address": address, "pubkey_pem": pub_pem}
+        wallets.append({"label": label, "pem": pem, "pub_pem": pub_pem, "address": address})
+    with open(os.path.join(out, "addresses.json"), "w") as f:
+        json.dump(book, f, indent=2)
+    return wallets
+
+
+def make_block(height: int, prev: str, body: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    header = {
+        "height": height,
+        "timestamp": BASE_TIME + height * BLOCK_SPACING,
+        "previousblock": prev,
+        "merkle_root": merkle_root([tx["txid"] for tx in body]),
+        "hash": hashlib.sha256(json.dumps(body, separators=(',', ':')).encode()).hexdigest(),
+    }
+    return block_hash(header), {"header": header, "body": body}
+
+
+def write_json(path: str, obj) -> None:
+    with open(path, "w") as f:
+        json.dump(obj, f, indent=2)
+
+
+class Generator:
+    def __init__(self, out: str, wallets: List[Dict[str, Any]], inputs: int, outputs: int,
+                 workers: Optional[int], seed: int):
+        self.out = out
+        self.wallets = wallets
+        self.inputs = inputs
+        self.outputs = outputs
+        self.rng = random.Random(seed)
+        # spendable outputs per wallet: [(txid, index, value)]
+        self.utxos: List[List[Tuple[str, int, int]]] = [[] for _ in wallets]
+        self.pool = Pool(workers, initializer=_init_signer, initargs=([w["pem"] for w in wallets],))
+        self.tx_count = 0
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+    def genesis(self, utxos_per_wallet: int) -> str:
+        outputs = [{"address": w["address"], "value": GENESIS_VALUE}
+                   for w in self.wallets for _ in range(utxos_per_wallet)]
+        body = {"timestamp": BASE_TIME, "inputs": [], "outputs": outputs}
+        coinbase = {"txid": hashlib.sha256(canonical(body).encode()).hexdigest(), "body": body, "inputs": []}
+        for i in range(len(outputs)):
+            self.utxos[i // utxos_per_wallet].append((coinbase["txid"], i, GENESIS_VALUE))
+        bhash, blk = make_block(0, "NA", [coinbase])
+        write_json(os.path.join(self.out, "Blocks", bhash + ".json"), blk)
+        return bhash
+
+    def make_txs(self, n: int, timestamp: int) -> List[Dict[str, Any]]:
+        # n txs spending current utxos; their outputs are only spendable after
+        # the caller hands them back through settle()
+        unsigned = []
+        for _ in range(n):
+            funded = [i for i, u in enumerate(self.utxos) if len(u) >= self.inputs]
+            if not funded:
+                break
+            w = self.rng.choice(funded)
+            spent = [self.utxos[w].pop(self.rng.randrange(len(self.utxos[w]))) for _ in range(self.inputs)]
+            total_in = sum(v for _, _, v in spent)
+            share = total_in // self.outputs
+            payees = [self.rng.randrange(len(self.wallets)) for _ in range(self.outputs - 1)]
+            outputs = [{"address": self.wallets[p]["address"], "value": share} for p in payees]
+            outputs.append({"address": self.wallets[w]["address"], "value": total_in - share * len(payees)})
+            body = {"timestamp": timestamp + self.tx_count,
+                    "inputs": [{"prev_txid": t, "prev_index": i} for t, i, _ in spent],
+                    "outputs": outputs}
+            self.tx_count += 1
+            unsigned.append((w, body))
+        sigs = self.pool.map(_sign, [(w, canonical(body).encode()) for w, body in unsigned], chunksize=16)
+        txs = []
+        for (w, body), sig in zip(unsigned, sigs):
+            pub = self.wallets[w]["pub_pem"]
+            txs.append({"txid": hashlib.sha256(canonical(body).encode()).hexdigest(), "body": body,
+                        "inputs": [{**i, "pubkey": pub, "signature": sig} for i in body["inputs"]]})
+        return txs
+
+    def settle(self, txs: List[Dict[str, Any]]) -> None:
+        owner = {w["address"]: i for i, w in enumerate(self.wallets)}
+        for tx in txs:
+            for idx, outp in enumerate(tx["body"]["outputs"]):
+                self.utxos[owner[outp["address"]]].append((tx["txid"], idx, outp["value"]))
+
+
+def generate(out: str, blocks: int, txs_per_block: int, inputs: int = 1, outputs: int = 2,
+             n_wallets: int = 10, pending: int = 0, key_size: int = 2048,
+             workers: Optional[int] = None, seed: int = 1, quiet: bool = False) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    for d in ("Blocks", "PendingTransactions", "ProcessedTransactions"):
+        os.makedirs(os.path.join(out, d), exist_ok=True)
+    wallets = make_wallets(out, n_wallets, key_size)
+
+    # enough genesis outputs that every block (and the pending backlog) can be
+    # funded even when txs consume more outputs than they create
+    per_block = txs_per_block * inputs
+    deficit = max(0, (blocks * txs_per_block + pending) * (inputs - outputs))
+    utxos_per_wallet = -(-(max(per_block, pending * inputs) + deficit) // n_wallets) + inputs
+
+    gen = Generator(out, wallets, inputs, outputs, workers, seed)
+    try:
+        prev = gen.genesis(utxos_per_wallet)
+        tip = prev
+        for height in range(1, blocks + 1):
+            txs = gen.make_txs(txs_per_block, BASE_TIME + height * BLOCK_SPACING)
+            tip, blk = make_block(height, tip, txs)
+            write_json(os.path.join(out, "Blocks", tip + ".json"), blk)
+            gen.settle(txs)
+            if not quiet and height % 100 == 0:
+                print(f"  block {height}/{blocks} ({gen.tx_count} txs, {time.perf_counter() - t0:.1f}s)")
+        backlog = gen.make_txs(pending, BASE_TIME + (blocks + 1) * BLOCK_SPACING)
+        for tx in backlog:
+            write_json(txfiles.path_for(os.path.join(out, "PendingTransactions"), tx["txid"], create=True), tx)
+    finally:
+        gen.close()
+    return {"out": out, "blocks": blocks + 1, "txs": gen.tx_count - len(backlog), "pending": len(backlog),
+            "wallets": n_wallets, "inputs": inputs, "outputs": outputs, "tip": tip,
+            "seconds": time.perf_counter() - t0}
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Generate a synthetic chain and pending backlog.")
+    ap.add_argument("out")
+    ap.add_argument("--blocks", type=int, default=1000, help="blocks after genesis")
+    ap.add_argument("--txs-per-block", type=int, default=50)
+    ap.add_argument("--inputs", type=int, default=1, help="inputs per tx")
+    ap.add_argument("--outputs", type=int, default=2, help="outputs per tx (last one is change)")
+    ap.add_argument("--wallets", type=int, default=10)
+    ap.add_argument("--pending", type=int, default=1000, help="signed txs left in PendingTransactions/")
+    ap.add_argument("--key-size", type=int, default=2048)
+    ap.add_argument("--workers", type=int, default=None, help="signing processes (default: all cores)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+    if args.inputs < 1 or args.outputs < 1:
+        ap.error("--inputs and --outputs must be at least 1")
+
+    res = generate(args.out, args.blocks, args.txs_per_block, args.inputs, args.outputs,
+                   args.wallets, args.pending, args.key_size, args.workers, args.seed)
+    print(f"wrote {res['blocks']} blocks, {res['txs']} txs and {res['pending']} pending txs "
+          f"to {res['out']} in {res['seconds']:.1f}s")
+    print(json.dumps(res))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+import json
+from typing import List, Dict, Any, Optional
+
+from chainstate import fsync_dir
+
+
+# Write-ahead journal for the miner's block commits (see Block.create_block()).
+#
+# A commit goes:
+#   1. begin(hash, height, files)  intent record with the pending files the block includes, fsynced
+#   2. the block is written to a temp file, fsynced and renamed into Blocks/
+#      (the rename is the commit point: the file is either complete or absent)
+#   3. the included txs are archived as one segment file for the block and
+#      their pending files deleted in one sweep, with a single directory fsync
+#   4. done()  truncates the journal
+# On startup incomplete() returns the begin records a crash interrupted. If
+# the block reached Blocks/ its archiving is redone (it is idempotent),
+# otherwise nothing was committed and its transactions stay pending. Either
+# way the record's temp file is removed; temp files of other miners sharing
+# Blocks/ are left alone, their writes may still be in flight. So a
+# block is never half-written, and a transaction is never both mined and still
+# pending. That costs a fixed number of fsyncs per block, however many
+# transactions it holds; FSYNC=0 turns them off (benchmarks only).
+
+JOURNAL_FILE = "block_journal.log"
+
+
+class BlockJournal:
+    def __init__(self, path: str = JOURNAL_FILE, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self._f = None
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def begin(self, bhash: str, height: int, files: List[str], tmp: Optional[str] = None) -> None:
+        # tmp: the temp file the block is written through, removed by recovery
+        if self._f is None:
+            self._f = open(self.path, "a")
+        rec = {"op": "begin", "block": bhash, "height": height, "files": files}
+        if tmp is not None:
+            rec["tmp"] = tmp
+        self._f.write(json.dumps(rec, separators=(',', ':')) + "\n")
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+            fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+
+    def done(self) -> None:
+        # not fsynced: if the truncate is lost, recovery just redoes the archiving
+        if self._f is None:
+            self._f = open(self.path, "a")
+        self._f.truncate(0)
+
+    def incomplete(self) -> List[Dict[str, Any]]:
+        # begin records still in the journal, oldest first; a torn last line
+        # (crash during begin) means that commit never started
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                if isinstance(rec, dict) and rec.get("op") == "begin":
+                    records.append(rec)
+        return records
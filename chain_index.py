@@ -0,0 +1,220 @@
+import os
+import sys
+import sqlite3
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+from chainstate import ChainState, BLOCKS_DIR
+import jsonio
+
+
+# Persistent address index of the active chain, kept in sqlite so readers (the
+# game launcher, wallets, the RPC server) can answer "did tx X pay address A?"
+# or "what did A send and receive?" without loading Blocks/.
+#
+#   python chain_index.py [--blocks-dir Blocks] [--db chain_index.db]
+#
+# The miner keeps it current by attaching it to its ChainState (connect and
+# disconnect events, so reorgs are undone). Readers open it with readonly=True,
+# which never creates or migrates anything, and call is_stale(): the tip height
+# and hash recorded at the last update against the highest block on disk.
+
+INDEX_DB = "chain_index.db"
+SCHEMA_VERSION = 2  # bumping it rebuilds the index from Blocks/ on the next attach()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS blocks (height INTEGER PRIMARY KEY, hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS txs (txid TEXT PRIMARY KEY, height INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS outputs (
+    txid TEXT NOT NULL, idx INTEGER NOT NULL, address TEXT NOT NULL, value INTEGER NOT NULL,
+    height INTEGER NOT NULL, PRIMARY KEY (txid, idx));
+CREATE INDEX IF NOT EXISTS outputs_by_address ON outputs (address, txid, value, height);
+CREATE INDEX IF NOT EXISTS txs_by_height ON txs (height);
+CREATE INDEX IF NOT EXISTS outputs_by_height ON outputs (height);
+CREATE TABLE IF NOT EXISTS history (
+    address TEXT NOT NULL, height INTEGER NOT NULL, txid TEXT NOT NULL, delta INTEGER NOT NULL,
+    PRIMARY KEY (address, height, txid));
+CREATE INDEX IF NOT EXISTS history_by_height ON history (height);
+"""
+
+
+def normalize_hex(value: str) -> str:
+    # the store records hashes/addresses as 0x-prefixed hex, the chain does not
+    value = value.strip().lower()
+    return value[2:] if value.startswith("0x") else value
+
+
+class ChainIndex:
+    def __init__(self, db_path: str = INDEX_DB, blocks_dir: str = BLOCKS_DIR, readonly: bool = False):
+        self.db_path = db_path
+        self.blocks_dir = blocks_dir
+        self.readonly = readonly
+        if readonly:
+            # the miner owns the schema; an older one just reads as stale
+            self.db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with self.db:
+                self._truncate(0)  # older layout: rebuild everything on attach()
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.db.close()
+
+    # ---------- updates ----------
+
+    def attach(self, state: ChainState) -> None:
+        # catch up with the state's active chain, then follow it
+        chain = state.active_chain()
+        stored = dict(self.db.execute("SELECT height, hash FROM blocks"))
+        fork = -1
+        for e in chain:
+            if stored.get(e.height) != e.hash:
+                break
+            fork = e.height
+        with self.db:
+            self._truncate(fork + 1)
+            for e in chain[fork + 1:]:
+                self._insert(e.height, e.hash, state.read_block(e.hash))
+            self._touch()
+        state.listeners.append(self.on_event)
+
+    def on_event(self, event: str, entry, blk: Dict[str, Any]) -> None:
+        with self.db:
+            self._truncate(entry.height)
+            if event == "connect":
+                self._insert(entry.height, entry.hash, blk)
+            self._touch()
+
+    def _insert(self, height: int, bhash: str, blk: Dict[str, Any]) -> None:
+        self.db.execute("INSERT INTO blocks VALUES (?, ?)", (height, bhash))
+        for tx in blk.get("body", []):
+            if not isinstance(tx, dict) or "txid" not in tx or "body" not in tx:
+                continue
+            txid = tx["txid"]
+            # per-address net effect: outputs received minus outputs spent
+            delta: Dict[str, int] = {}
+            for inp in tx.get("inputs", []):
+                prev = self.db.execute("SELECT address, value FROM outputs WHERE txid = ? AND idx = ?",
+                                       (inp["prev_txid"], inp["prev_index"])).fetchone()
+                if prev is not None:
+                    delta[prev[0]] = delta.get(prev[0], 0) - prev[1]
+            outs = []
+            for i, outp in enumerate(tx["body"].get("outputs", [])):
+                outs.append((txid, i, outp["address"], outp["value"], height))
+                delta[outp["address"]] = delta.get(outp["address"], 0) + outp["value"]
+            self.db.execute("INSERT OR REPLACE INTO txs VALUES (?, ?)", (txid, height))
+            self.db.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)", outs)
+            self.db.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?)",
+                                [(addr, height, txid, d) for addr, d in delta.items()])
+
+    def _truncate(self, height: int) -> None:
+        # drop everything at or above height (reorged-out blocks)
+        for table in ("blocks", "txs", "outputs", "history"):
+            self.db.execute(f"DELETE FROM {table} WHERE height >= ?", (height,))
+        if height == 0:
+            self.db.execute("DELETE FROM meta")  # what it described is gone too
+
+    def _touch(self) -> None:
+        mtime = os.stat(self.blocks_dir).st_mtime_ns if os.path.isdir(self.blocks_dir) else 0
+        tip = self.tip()
+        self.db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+            ("blocks_mtime", str(mtime)),
+            ("tip_height", str(tip[0] if tip else -1)),
+            ("tip_hash", tip[1] if tip else ""),
+        ])
+
+    # ---------- queries ----------
+
+    def tip(self) -> Optional[Tuple[int, str]]:
+        return self.db.execute("SELECT height, hash FROM blocks ORDER BY height DESC LIMIT 1").fetchone()
+
+    def is_stale(self) -> bool:
+        # the recorded tip is gone from Blocks/, or a block file written since
+        # the last update is higher than it (or never built). Undo and temp
+        # files, and side-branch blocks, leave it current.
+        try:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                return True
+            meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            return True
+        if not {"blocks_mtime", "tip_height", "tip_hash"} <= meta.keys() or not os.path.isdir(self.blocks_dir):
+            return True
+        since, height = int(meta["blocks_mtime"]), int(meta["tip_height"])
+        if os.stat(self.blocks_dir).st_mtime_ns <= since:
+            return False  # nothing added or removed
+        if meta["tip_hash"] and not os.path.exists(os.path.join(self.blocks_dir, meta["tip_hash"] + ".json")):
+            return True
+        with os.scandir(self.blocks_dir) as it:
+            for e in it:
+                if not e.name.endswith(".json") or e.stat().st_mtime_ns < since:
+                    continue
+                try:
+                    with open(e.path, "rb") as f:
+                        blk = jsonio.load(f)
+                except (OSError, ValueError):
+                    continue  # half-written; the miner has not seen it either
+                header = blk.get("header") if isinstance(blk, dict) else None
+                if isinstance(header, dict) and isinstance(header.get("height"), int) and header["height"] > height:
+                    return True
+        return False
+
+    def paid_to(self, txid: str, address: str) -> Optional[Dict[str, Any]]:
+        # outputs of a confirmed tx to address, via the address index
+        rows = self.db.execute(
+            "SELECT value, height FROM outputs WHERE address = ? AND txid = ?",
+            (normalize_hex(address), normalize_hex(txid))).fetchall()
+        if not rows:
+            return None
+        return {"txid": normalize_hex(txid), "value": sum(r[0] for r in rows), "height": rows[0][1]}
+
+    def history(self, address: str, limit: int = 50,
+                cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # newest first, one page at a time; pass the returned cursor to get the
+        # next page (None when there are no more). Keyset paging, so deep pages
+        # cost the same as the first one.
+        address = normalize_hex(address)
+        if cursor:
+            height, txid = cursor.split(":", 1)
+            rows = self.db.execute(
+                "SELECT height, txid, delta FROM history WHERE address = ? "
+                "AND (height < ? OR (height = ? AND txid < ?)) "
+                "ORDER BY height DESC, txid DESC LIMIT ?",
+                (address, int(height), int(height), txid, limit)).fetchall()
+        else:
+            rows = self.db.execute(
+                "SELECT height, txid, delta FROM history WHERE address = ? "
+                "ORDER BY height DESC, txid DESC LIMIT ?", (address, limit)).fetchall()
+        page = [{"height": h, "txid": t, "delta": d} for h, t, d in rows]
+        nxt = f"{rows[-1][0]}:{rows[-1][1]}" if len(rows) == limit else None
+        return page, nxt
+
+    def balance(self, address: str) -> int:
+        row = self.db.execute("SELECT SUM(delta) FROM history WHERE address = ?",
+                              (normalize_hex(address),)).fetchone()
+        return row[0] or 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Build or update the chain address index.")
+    ap.add_argument("--blocks-dir", default=BLOCKS_DIR)
+    ap.add_argument("--db", default=INDEX_DB)
+    args = ap.parse_args(argv)
+
+    state = ChainState(args.blocks_dir, persist_undo=False)  # a reader: leaves Blocks/ alone
+    state.load()
+    index = ChainIndex(args.db, args.blocks_dir)
+    index.attach(state)
+    tip = index.tip()
+    print(f"indexed up to height {tip[0]} {tip[1]}" if tip else "no blocks indexed")
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import argparse
+from typing import Any, Optional, Tuple, List
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+# JSON backend for the hot paths: canonical() for txids and block hashes,
+# block/pending reads and block writes.
+#
+#   python jsonio.py --check [DIR ...]    byte-compare both backends on the JSON files
+#                                         under DIR, exit 1 on any difference
+#
+# Uses orjson when it is installed and the stdlib json module otherwise
+# (JSON_BACKEND=json forces the stdlib). Every encoder here promises the exact
+# bytes of the json.dumps() call it replaces, because txids, block file
+# names and header["hash"] are hashes of those bytes. orjson only handles
+# the values it writes identically:
+#   - non-ASCII output and DEL: json.dumps escapes them (ensure_ascii), orjson does not
+#   - floats: the exponent forms differ ("1e+16" / "1e16", "1e-05" / "0.00001")
+#   - ints beyond 64 bits, non-str keys, subclasses: orjson refuses or differs
+# Anything else falls back to json.dumps, so the fast path can only be slower,
+# never different. Decoding falls back to json.loads for NaN/Infinity (orjson
+# rejects them) and for integers of 19+ digits (orjson turns them into floats); input
+# is best passed as bytes, a file opened "rb", which skips the text decode.
+
+BACKEND = "orjson" if orjson is not None and os.environ.get("JSON_BACKEND", "") != "json" else "json"
+_fast = BACKEND == "orjson"
+# big-int guard for loads(): map digits to b"0", the bytes that can start a
+# number token (separators, whitespace, "-") to b"s" and the rest to b"x", then
+# look for a separator followed by 19 digits. A plain digit search would also
+# hit every long digit run in the hex strings, which is most blocks.
+_NUMBER_START = b":,[ \t\n\r-"
+_DIGITS = bytes(48 if 48 <= i <= 57 else 115 if i in _NUMBER_START else 120 for i in range(256))
+_LONG_NUMBER = b"s" + b"0" * 19
+
+
+def _plain(obj: Any) -> bool:
+    # only exact dict/list/str/int/bool/None, which both encoders write the same
+    t = type(obj)
+    if t is dict:
+        for v in obj.values():
+            if not _plain(v):
+                return False
+        return True
+    if t is list:
+        for v in obj:
+            if not _plain(v):
+                return False
+        return True
+    return t is str or t is int or t is bool or obj is None
+
+
+def _orjson(obj: Any, option: int) -> Optional[str]:
+    if not _plain(obj):
+        return None
+    try:
+        out = orjson.dumps(obj, option=option)
+    except TypeError:
+        return None  # big ints, non-str keys
+    return out.decode() if out.isascii() and b"\x7f" not in out else None
+
+
+def canonical(obj: Any) -> str:
+    # == json.dumps(obj, separators=(',', ':'), sort_keys=True)
+    if _fast:
+        out = _orjson(obj, orjson.OPT_SORT_KEYS)
+        if out is not None:
+            return out
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True)
+
+
+def compact(obj: Any) -> str:
+    # == json.dumps(obj, separators=(',', ':')), keys in insertion order
+    if _fast:
+        out = _orjson(obj, 0)
+        if out is not None:
+            return out
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def dumps(obj: Any, indent: Optional[int] = None, separators: Optional[Tuple[str, str]] = None,
+          sort_keys: bool = False) -> str:
+    # == json.dumps(obj, indent=..., separators=..., sort_keys=...)
+    if _fast:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        if indent is None and separators == (',', ':'):
+            out = _orjson(obj, option)
+        elif indent == 2 and separators in (None, (',', ': ')):
+            out = _orjson(obj, option | orjson.OPT_INDENT_2)
+        else:
+            out = None
+        if out is not None:
+            return out
+    return json.dumps(obj, indent=indent, separators=separators, sort_keys=sort_keys)
+
+
+def loads(data) -> Any:
+    # str or bytes
+    if _fast:
+        raw = data.encode() if isinstance(data, str) else data
+        marked = raw.translate(_DIGITS)
+        if _LONG_NUMBER in marked or marked.lstrip(b"s").startswith(_LONG_NUMBER[1:]):
+            return json.loads(data)  # a top-level number has no separator before it
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass  # NaN / Infinity, or really invalid: let json.loads decide
+    return json.loads(data)
+
+
+def load(f) -> Any:
+    return loads(f.read())
+
+
+# ---------- compatibility check ----------
+
+# The edge cases live in tests/test_jsonio.py; --check covers real chain data.
+
+
+def _check_one(obj: Any) -> List[str]:
+    bad = []
+    for name, ours, ref in (
+            ("canonical", canonical, lambda o: json.dumps(o, separators=(',', ':'), sort_keys=True)),
+            ("compact", compact, lambda o: json.dumps(o, separators=(',', ':'))),
+            ("indent2", lambda o: dumps(o, indent=2), lambda o: json.dumps(o, indent=2))):
+        try:
+            expected = ref(obj)
+        except (TypeError, ValueError):
+            continue
+        if ours(obj) != expected:
+            bad.append(name)
+    text = json.dumps(obj)
+    ours, ref = loads(text), json.loads(text)
+    if repr(ours) != repr(ref):  # repr: NaN != NaN, and 1 == 1.0 would hide a float
+        bad.append("loads")
+    return bad
+
+
+def _walk_json_files(root: str):
+    for dirpath, _dirs, files in os.walk(root):
+        for fname in files:
+            if fname.endswith(".json"):
+                yield os.path.join(dirpath, fname)
+
+
+def check(dirs: List[str]) -> int:
+    # every tx and block on disk; returns the mismatch count
+    failures = 0
+    checked = 0
+    for root in dirs:
+        for path in _walk_json_files(root):
+            with open(path, "r") as f:
+                try:
+                    doc = json.load(f)
+                except ValueError:
+                    continue
+            items = [doc]
+            if isinstance(doc, dict) and isinstance(doc.get("body"), list):
+                items.append(doc["header"] if "header" in doc else None)
+                items.extend(doc["body"])
+            for obj in items:
+                checked += 1
+                for name in _check_one(obj):
+                    failures += 1
+                    print(f"MISMATCH {name}: {path}")
+    print(f"backend {BACKEND}: {checked} objects checked, {failures} mismatch(es)")
+    return failures
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="JSON backend info and compatibility check.")
+    ap.add_argument("--check", nargs="*", metavar="DIR",
+                    help="compare with the stdlib on the JSON files under DIR "
+                         "(default: Blocks PendingTransactions)")
+    args = ap.parse_args(argv)
+    if args.check is None:
+        print(BACKEND)
+        return 0
+    return 1 if check(args.check or ["Blocks", "PendingTransactions"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple
+
+
+# In-process metrics for the miner: stage timings, counters and gauges.
+#
+#   with metrics.stage("read_json"):
+#       ...
+#   metrics.inc("rejects_total", reason="bad_signature")
+#   metrics.set_gauge("utxo_set_size", len(utxos))
+#
+# Exported two ways: Prometheus text format (GET /metrics on the RPC server,
+# see rpc.py) and a JSON snapshot written atomically to METRICS_FILE after every
+# miner pass. Stage timings are summaries: total seconds, count, max and the
+# last observation, so "sum / count" is the mean cost of one call.
+
+PREFIX = "miner_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Labels]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    # exact: "{:g}" keeps 6 significant digits, so a counter past 1e6 stalls
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, stage_name: str, seconds: float) -> None:
+        with self.lock:
+            s = self.stages.get(stage_name)
+            if s is None:
+                s = self.stages[stage_name] = {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0}
+            s["count"] += 1
+            s["sum"] += seconds
+            s["last"] = seconds
+            if seconds > s["max"]:
+                s["max"] = seconds
+
+    @contextmanager
+    def stage(self, stage_name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage_name, time.perf_counter() - t0)
+
+    # ---------- export ----------
+
+    def snapshot(self) -> Dict[str, Any]:
+        def flat(d):
+            return [{"name": n, "labels": dict(lbl), "value": v} for (n, lbl), v in sorted(d.items())]
+        with self.lock:
+            return {"time": time.time(), "uptime": time.time() - self.started,
+                    "stages": {k: dict(v) for k, v in sorted(self.stages.items())},
+                    "counters": flat(self.counters), "gauges": flat(self.gauges)}
+
+    def prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            lines.append(f"# TYPE {PREFIX}stage_seconds summary")
+            for name, s in sorted(self.stages.items()):
+                lines.append(f'{PREFIX}stage_seconds_sum{{stage="{name}"}} {s["sum"]:.6f}')
+                lines.append(f'{PREFIX}stage_seconds_count{{stage="{name}"}} {s["count"]}')
+            lines.append(f"# TYPE {PREFIX}stage_seconds_max gauge")
+            for name, s in sorted(self.stages.items()):
+                lines.append(f'{PREFIX}stage_seconds_max{{stage="{name}"}} {s["max"]:.6f}')
+            lines.append(f"# TYPE {PREFIX}stage_seconds_last gauge")
+            for name, s in sorted(self.stages.items()):
+                lines.append(f'{PREFIX}stage_seconds_last{{stage="{name}"}} {s["last"]:.6f}')
+            typed = set()
+            for kind, table in (("counter", self.counters), ("gauge", self.gauges)):
+                for (name, labels), value in sorted(table.items()):
+                    if name not in typed:
+                        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+
+REGISTRY = Metrics()
+
+# module-level shortcuts on the default registry
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set_gauge
+observe = REGISTRY.observe
+stage = REGISTRY.stage
@@ -0,0 +1,708 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+from chainstate import (ChainState, UtxoView, block_hash, block_hash_of, check_block, is_hash,
+                        load_checkpoint, write_json_atomic, CHECKPOINT_FILE)
+from Block import validate_transaction, archive_included, archive_rejected
+import jsonio
+import txfiles
+
+
+# Peer-to-peer node: gossips transactions and blocks between miners over TCP
+# instead of a shared folder.
+#
+#   python node.py --dir nodeA --port 9001 --peer 127.0.0.1:9002 --peer 127.0.0.1:9003
+#
+# Each node owns a data dir laid out like the miner's (Blocks/,
+# PendingTransactions/, ProcessedTransactions/), so Block.py and the wallets can
+# keep running against it unchanged. Messages are one JSON object per line:
+#
+#   hello     {"port", "height", "tip"}
+#   inv       {"items": [["tx"|"block", id], ...]}     announce what we have
+#   getdata   {"items": [...]}                          ask for what we lack
+#   tx        {"tx": {...}}
+#   block     {"block": {...}}
+#   notfound  {"items": [...]}
+#   getheaders {"locator": [hash, ...]}                 headers-first sync
+#   headers   {"headers": [header, ...]}
+#   getblocks {"hashes": [...]}                         one download window
+#   blocks    {"hashes": [...], "blocks": [{...}, ...]}   reply to getblocks
+#   cmpctblock {"header", "salt", "shortids": [...], "prefilled": [[index, tx], ...]}
+#   getblocktxn {"hash", "indexes": [...]}               txs a compact block lacked
+#   blocktxn  {"hash", "txs": [...]}
+#
+# A node that is behind a peer first downloads and validates the header chain
+# (linkage, height, PoW/difficulty) in HEADERS_BATCH steps, then fetches block
+# bodies in BLOCK_WINDOW-sized height windows spread over every peer that has
+# them, several windows in flight per peer. Bodies are checked (merkle_root,
+# body hash) as they land and ChainState connects them strictly in height order.
+#
+# New blocks go to peers that said "compact": true in hello as a cmpctblock:
+# the header plus a 6-byte salted short id per transaction. Peers already hold
+# almost all of those in their mempool (PendingTransactions/), so they rebuild
+# the block locally and only ask for the transactions they are missing. If the
+# rebuilt block does not match its merkle_root/body hash (a short id collision)
+# the full block is fetched instead.
+#
+# Received transactions go through validate_transaction() against the chain +
+# mempool view and are written to PendingTransactions/ for the local miner.
+# Received blocks are handed to ChainState.add_block(), which validates and
+# connects them (reorging if needed); a block file is only written to Blocks/
+# once its block has connected, so invalid peer blocks never land on disk.
+# Side-branch bodies wait in memory until they connect.
+
+MAX_MSG = 64 * 1024 * 1024  # largest line a peer may send
+POLL_INTERVAL = 1.0         # seconds between scans for locally mined blocks/txs
+HEADERS_BATCH = 2000        # headers per "headers" reply
+BLOCK_WINDOW = 128          # blocks per "getblocks" request
+WINDOWS_PER_PEER = 4        # download windows in flight per peer
+COMPACT_BLOCKS = True       # announce new blocks as compact blocks when peers accept them
+SHORTID_LEN = 12            # hex chars (6 bytes) of sha256(salt + txid)
+MAX_ITEMS = 50_000          # longest id list a peer may send in one message
+MAX_BAD_MESSAGES = 10       # malformed messages before a peer is dropped
+PARTIAL_MAX = 64            # compact blocks waiting on a blocktxn reply
+PARTIAL_TTL = 60.0          # seconds to wait for that reply before giving up
+
+MESSAGES = ("hello", "inv", "getdata", "tx", "block", "notfound", "getheaders", "headers",
+            "getblocks", "blocks", "cmpctblock", "getblocktxn", "blocktxn")
+
+
+def encode(msg: Dict[str, Any]) -> bytes:
+    return (jsonio.compact(msg) + "\n").encode()
+
+
+def short_id(salt: str, txid: str) -> str:
+    return hashlib.sha256((salt + txid).encode()).hexdigest()[:SHORTID_LEN]
+
+
+def parse_items(items: Any) -> List[List[str]]:
+    # inv / getdata / notfound: [[kind, id], ...]; ValueError on anything else
+    if not isinstance(items, list) or len(items) > MAX_ITEMS:
+        raise ValueError("items is not a list")
+    for it in items:
+        if not (isinstance(it, list) and len(it) == 2 and isinstance(it[0], str) and is_hash(it[1])):
+            raise ValueError(f"bad item {str(it)[:80]}")
+    return items
+
+
+def parse_hashes(hashes: Any) -> List[str]:
+    # getblocks / blocks / locators: [hash, ...]; ValueError on anything else
+    if not isinstance(hashes, list) or len(hashes) > MAX_ITEMS or not all(is_hash(h) for h in hashes):
+        raise ValueError("bad hash list")
+    return hashes
+
+
+class Peer:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, outbound: bool):
+        self.reader = reader
+        self.writer = writer
+        self.outbound = outbound
+        self.listen_port: Optional[int] = None
+        self.height = -1
+        self.compact = False  # peer wants cmpctblock announcements
+        self.bad_messages = 0
+        self.bytes_sent: Dict[str, int] = {}
+        host, port = writer.get_extra_info("peername")[:2]
+        self.addr = f"{host}:{port}"
+
+    async def send(self, msg: Dict[str, Any]) -> None:
+        data = encode(msg)
+        self.bytes_sent[msg["type"]] = self.bytes_sent.get(msg["type"], 0) + len(data)
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class Node:
+    def __init__(self, data_dir: str, host: str = "127.0.0.1", port: int = 0,
+                 seeds: Optional[List[Tuple[str, int]]] = None):
+        self.data_dir = data_dir
+        self.host = host
+        self.port = port
+        self.seeds = list(seeds or [])
+        self.blocks_dir = os.path.join(data_dir, "Blocks")
+        self.pending_dir = os.path.join(data_dir, "PendingTransactions")
+        self.processed_dir = os.path.join(data_dir, "ProcessedTransactions")
+        for d in (self.blocks_dir, self.pending_dir, self.processed_dir):
+            os.makedirs(d, exist_ok=True)
+
+        self.state = ChainState(self.blocks_dir, validate_tx=validate_transaction,
+                                assume_valid=load_checkpoint(os.path.join(data_dir, CHECKPOINT_FILE)))
+        self.state.listeners.append(self._on_chain_event)
+        self.mempool: Dict[str, Dict[str, Any]] = {}
+        self.view = UtxoView(self.state.utxos)  # chain utxos + mempool
+        self.confirmed: List[Tuple[str, int, List[str]]] = []  # (hash, height, txids) connected since last sweep
+        self.resurrect: List[Dict[str, Any]] = []  # txs from disconnected blocks
+        self.peers: List[Peer] = []
+        self.requested = set()                  # (kind, id) asked for, not yet received
+        self.active: List[str] = []             # active chain hashes by height
+        self.download_queue: List[List[str]] = []       # body windows not yet assigned
+        self.in_flight: Dict[Peer, List[List[str]]] = {}  # windows assigned per peer
+        self.queued = set()                     # hashes queued or in flight
+        self.partial: Dict[str, Dict[str, Any]] = {}  # compact blocks waiting on txs, oldest first
+        self.server = None
+        self._tasks = []
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        self.state.load()
+        self.confirmed.clear()
+        self._load_pending()
+        self.server = await asyncio.start_server(self._on_inbound, self.host, self.port, limit=MAX_MSG)
+        self.port = self.server.sockets[0].getsockname()[1]
+        for host, port in self.seeds:
+            await self.connect(host, port)
+        self._tasks.append(asyncio.ensure_future(self._poll_local()))
+        print(f"[node {self.port}] listening, height {self.height}, {len(self.mempool)} tx in mempool")
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        for p in list(self.peers):
+            p.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def connect(self, host: str, port: int) -> Optional[Peer]:
+        try:
+            reader, writer = await asyncio.open_connection(host, port, limit=MAX_MSG)
+        except OSError as e:
+            print(f"[node {self.port}] cannot reach {host}:{port}: {e}")
+            return None
+        peer = Peer(reader, writer, outbound=True)
+        self._tasks.append(asyncio.ensure_future(self._run_peer(peer)))
+        return peer
+
+    async def _on_inbound(self, reader, writer) -> None:
+        try:
+            await self._run_peer(Peer(reader, writer, outbound=False))
+        except asyncio.CancelledError:
+            pass  # node shutting down
+
+    async def _run_peer(self, peer: Peer) -> None:
+        self.peers.append(peer)
+        try:
+            await peer.send({"type": "hello", "port": self.port, "height": self.height,
+                             "tip": self.state.tip.hash if self.state.tip else None,
+                             "compact": COMPACT_BLOCKS})
+            while True:
+                line = await peer.reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = jsonio.loads(line)
+                except ValueError:
+                    msg = None
+                if not isinstance(msg, dict) or msg.get("type") not in MESSAGES:
+                    if self._penalize(peer, "unreadable message"):
+                        break
+                    continue
+                try:
+                    await getattr(self, "_on_" + msg["type"])(peer, msg)
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    # a malformed message costs the peer, never the node
+                    if self._penalize(peer, f"bad {msg['type']}: {e!r}"):
+                        break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            if peer in self.peers:
+                self.peers.remove(peer)
+            # hand its unfinished download windows to someone else
+            self.download_queue[:0] = self.in_flight.pop(peer, [])
+            peer.close()
+
+    def _penalize(self, peer: Peer, why: str) -> bool:
+        # True once the peer has sent too many bad messages and gets dropped
+        peer.bad_messages += 1
+        print(f"[node {self.port}] {peer.addr}: {why[:200]}")
+        if peer.bad_messages >= MAX_BAD_MESSAGES:
+            print(f"[node {self.port}] dropping {peer.addr}")
+            return True
+        return False
+
+    # ---------- state ----------
+
+    @property
+    def height(self) -> int:
+        return self.state.tip.height if self.state.tip else -1
+
+    def has(self, kind: str, item_id: str) -> bool:
+        if not is_hash(item_id):
+            return True  # nothing to ask for, and never a path
+        if kind == "tx":
+            return item_id in self.mempool
+        if kind == "block":
+            return self.state.has_block(item_id) or os.path.exists(self.state.block_path(item_id))
+        return True
+
+    def _read_block(self, bhash: str) -> Optional[Dict[str, Any]]:
+        # a block we can serve: on disk, or a side-branch body still in memory
+        if not self.state.has_block(bhash):
+            return None
+        try:
+            return self.state.read_block(bhash)
+        except (OSError, ValueError):
+            return None  # failed to connect and was dropped
+
+    def _load_pending(self) -> None:
+        for rel in txfiles.list_sorted(self.pending_dir):
+            try:
+                with open(os.path.join(self.pending_dir, rel), "rb") as f:
+                    tx = jsonio.load(f)
+            except Exception:
+                continue
+            self.accept_tx(tx, write=False)
+
+    def _on_chain_event(self, event: str, entry, blk: Dict[str, Any]) -> None:
+        if event == "connect" and not os.path.exists(self.state.block_path(entry.hash)):
+            write_json_atomic(self.state.block_path(entry.hash), blk, indent=2)  # validated now
+        txs = [tx for tx in blk["body"] if isinstance(tx, dict) and "txid" in tx]
+        del self.active[entry.height:]
+        if event == "connect":
+            self.active.append(entry.hash)
+            self.confirmed.append((entry.hash, entry.height, [tx["txid"] for tx in txs]))
+        elif entry.parent is not None:
+            self.resurrect.extend(txs)
+
+    def _sweep_mempool(self) -> None:
+        # after the tip moves: drop confirmed txs, re-check the rest against the new chain;
+        # pending files are archived like the miner does it (Block.archive_included)
+        for bhash, height, txids in self.confirmed:
+            files = []
+            for txid in txids:
+                rel = self._pending_rel(txid) if self.mempool.pop(txid, None) is not None else None
+                if rel:
+                    files.append(rel)
+            if files:
+                archive_included(bhash, height, files, self.pending_dir, self.processed_dir)
+        self.confirmed.clear()
+        old = self.mempool
+        self.mempool = {}
+        self.view = UtxoView(self.state.utxos)
+        # txs from blocks that were reorged out go back in first
+        for tx in self.resurrect:
+            if tx["txid"] not in old:
+                self.accept_tx(tx)
+        self.resurrect.clear()
+        rejects = {}
+        for txid, tx in old.items():
+            # signatures were checked on admission and cannot change with the
+            # tip; only which inputs exist (and so the amounts) can
+            result = validate_transaction(tx, self.view, check_signatures=False)
+            if result:
+                self.mempool[txid] = tx
+                self.view.apply(tx)
+            else:
+                rel = self._pending_rel(txid)
+                if rel:
+                    rejects[rel] = {"code": result.code, "reason": result.reject, "tx": tx}
+        if rejects:
+            os.makedirs(os.path.join(self.processed_dir, "invalid"), exist_ok=True)
+            archive_rejected(rejects, self.pending_dir, self.processed_dir)
+
+    def _pending_rel(self, txid: str) -> Optional[str]:
+        # pending file of txid relative to PendingTransactions/, or None
+        src = txfiles.locate(self.pending_dir, txid)
+        return os.path.relpath(src, self.pending_dir) if src is not None else None
+
+    # ---------- accepting items ----------
+
+    def accept_tx(self, tx: Dict[str, Any], write: bool = True) -> bool:
+        txid = tx.get("txid") if isinstance(tx, dict) else None
+        if not is_hash(txid) or txid in self.mempool:
+            return False
+        if not validate_transaction(tx, self.view):
+            return False
+        self.mempool[txid] = tx
+        self.view.apply(tx)
+        if write:
+            if txfiles.locate(self.pending_dir, txid) is None:
+                # atomic, so the miner's pending scan never archives a torn file as invalid
+                write_json_atomic(txfiles.path_for(self.pending_dir, txid, create=True), tx,
+                                  fsync=False, indent=2)
+        return True
+
+    def accept_block(self, blk: Dict[str, Any]) -> Tuple[Optional[str], List[str]]:
+        # returns (block hash if new and well-formed, hashes newly linked into
+        # the tree -- the block itself plus any orphans it unblocked)
+        if not isinstance(blk, dict) or not isinstance(blk.get("header"), dict) \
+                or not isinstance(blk.get("body"), list) or not isinstance(blk["header"].get("height"), int):
+            return None, []
+        bhash = block_hash_of(blk)
+        if self.state.has_block(bhash) or check_block(blk, bhash) is not None:
+            return None, []
+        old_tip = self.state.tip
+        linked = self.state.add_block(blk, bhash)
+        if self.state.tip is not old_tip:
+            self._sweep_mempool()
+        return bhash, [e.hash for e in linked]
+
+    # ---------- gossip ----------
+
+    def make_compact(self, blk: Dict[str, Any]) -> Dict[str, Any]:
+        # txs without inputs (coinbase) are never in a mempool, so send them whole
+        salt = block_hash_of(blk) + f"{random.getrandbits(32):08x}"
+        shortids, prefilled = [], []
+        for i, tx in enumerate(blk["body"]):
+            if isinstance(tx, dict) and tx.get("inputs") and "txid" in tx:
+                shortids.append(short_id(salt, tx["txid"]))
+            else:
+                prefilled.append([i, tx])
+        return {"type": "cmpctblock", "header": blk["header"], "salt": salt,
+                "shortids": shortids, "prefilled": prefilled}
+
+    async def relay(self, items: List[List[str]], exclude: Optional[Peer] = None) -> None:
+        if not items:
+            return
+        compact = {}
+        if COMPACT_BLOCKS:
+            for kind, item_id in items:
+                if kind == "block" and self.state.has_block(item_id):
+                    compact[item_id] = self.make_compact(self.state.read_block(item_id))
+        for p in list(self.peers):
+            if p is exclude:
+                continue
+            try:
+                if p.compact and compact:
+                    for msg in compact.values():
+                        await p.send(msg)
+                    rest = [it for it in items if it[1] not in compact]
+                else:
+                    rest = items
+                if rest:
+                    await p.send({"type": "inv", "items": rest})
+            except ConnectionError:
+                pass
+
+    async def _poll_local(self) -> None:
+        # pick up blocks mined and txs signed locally by Block.py / the wallets
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            await self.poll_local_once()
+
+    async def poll_local_once(self) -> None:
+        old_tip = self.state.tip
+        linked = self.state.refresh()
+        if self.state.tip is not old_tip:
+            self._sweep_mempool()
+        new_blocks = [["block", e.hash] for e in linked]
+
+        new_txs = []
+        for rel in txfiles.iter_files(self.pending_dir):
+            txid = os.path.basename(rel)[:-5]
+            if txid in self.mempool:
+                continue
+            try:
+                with open(os.path.join(self.pending_dir, rel), "rb") as f:
+                    tx = jsonio.load(f)
+            except Exception:
+                continue
+            if self.accept_tx(tx, write=False):
+                new_txs.append(["tx", tx["txid"]])
+        await self.relay(new_blocks + new_txs)
+
+    # ---------- message handlers ----------
+
+    async def _on_hello(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        if not isinstance(msg.get("height", -1), int) or not isinstance(msg.get("port"), (int, type(None))):
+            raise ValueError("bad hello")
+        peer.listen_port = msg.get("port")
+        peer.height = msg.get("height", -1)
+        peer.compact = bool(msg.get("compact"))
+        tip = msg.get("tip")
+        if tip and not self.has("block", tip):
+            await self.start_sync(peer)
+
+    async def _on_inv(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        await self._request(peer, parse_items(msg.get("items", [])))
+
+    async def _request(self, peer: Peer, items: List[List[str]]) -> None:
+        want = []
+        for kind, item_id in items:
+            key = (kind, item_id)
+            if key in self.requested or self.has(kind, item_id):
+                continue
+            self.requested.add(key)
+            want.append([kind, item_id])
+        if want:
+            await peer.send({"type": "getdata", "items": want})
+
+    async def _on_getdata(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        missing = []
+        for kind, item_id in parse_items(msg.get("items", [])):
+            if kind == "tx" and item_id in self.mempool:
+                await peer.send({"type": "tx", "tx": self.mempool[item_id]})
+            elif kind == "block" and self._read_block(item_id) is not None:
+                await peer.send({"type": "block", "block": self._read_block(item_id)})
+            else:
+                missing.append([kind, item_id])
+        if missing:
+            await peer.send({"type": "notfound", "items": missing})
+
+    async def _on_notfound(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        for kind, item_id in parse_items(msg.get("items", [])):
+            self.requested.discard((kind, item_id))
+
+    async def _on_tx(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        tx = msg.get("tx")
+        if isinstance(tx, dict):
+            self.requested.discard(("tx", tx.get("txid")))
+        if self.accept_tx(tx):
+            await self.relay([["tx", tx["txid"]]], exclude=peer)
+
+    async def _on_block(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        await self._handle_block(peer, msg.get("block"))
+
+    async def _handle_block(self, peer: Peer, blk: Dict[str, Any]) -> None:
+        bhash, linked = self.accept_block(blk)
+        if bhash is None:
+            return
+        self.requested.discard(("block", bhash))
+        if bhash not in self.state.index:
+            # orphan: we are missing more than one block, sync headers first
+            peer.height = max(peer.height, blk["header"]["height"])
+            await self.start_sync(peer)
+            return
+        await self.relay([["block", h] for h in linked], exclude=peer)
+
+    # ---------- compact blocks ----------
+
+    async def _on_cmpctblock(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        header = msg.get("header")
+        if not isinstance(header, dict) or not isinstance(header.get("height"), int):
+            raise ValueError("bad header")
+        salt = msg.get("salt", "")
+        shortids = msg.get("shortids", [])
+        prefilled = msg.get("prefilled", [])
+        if not isinstance(salt, str) or not isinstance(shortids, list) or not isinstance(prefilled, list) \
+                or not all(isinstance(s, str) for s in shortids):
+            raise ValueError("bad short ids")
+        n = len(shortids) + len(prefilled)
+        if n > MAX_ITEMS or not all(isinstance(p, list) and len(p) == 2 and isinstance(p[0], int)
+                                    and 0 <= p[0] < n for p in prefilled) \
+                or len({p[0] for p in prefilled}) != len(prefilled):
+            raise ValueError("bad prefilled txs")
+        bhash = block_hash(header)
+        if self.has("block", bhash) or bhash in self.partial:
+            return
+        peer.height = max(peer.height, header["height"])
+        if header.get("previousblock") not in self.state.index and header["height"] != 0:
+            await self.start_sync(peer)  # too far behind to use it
+            return
+
+        slots: List[Optional[Dict[str, Any]]] = [None] * n
+        for i, tx in prefilled:
+            slots[i] = tx
+
+        # short id -> mempool tx; ids two mempool txs share are left unresolved
+        pool: Dict[str, Optional[Dict[str, Any]]] = {}
+        for txid, tx in self.mempool.items():
+            sid = short_id(salt, txid)
+            pool[sid] = None if sid in pool else tx
+        ids = iter(shortids)
+        missing = []
+        for i in range(len(slots)):
+            if slots[i] is None:
+                slots[i] = pool.get(next(ids))
+                if slots[i] is None:
+                    missing.append(i)
+
+        if missing:
+            self._expire_partial()
+            self.partial[bhash] = {"header": header, "slots": slots, "time": time.monotonic()}
+            await peer.send({"type": "getblocktxn", "hash": bhash, "indexes": missing})
+        else:
+            await self._finish_compact(peer, bhash, header, slots)
+
+    def _expire_partial(self) -> None:
+        # drop compact blocks whose blocktxn never came, then the oldest past the cap;
+        # the block still arrives through inv/getdata or header sync if it matters
+        cutoff = time.monotonic() - PARTIAL_TTL
+        for bhash in [h for h, part in self.partial.items() if part["time"] < cutoff]:
+            del self.partial[bhash]
+        while len(self.partial) >= PARTIAL_MAX:
+            del self.partial[next(iter(self.partial))]
+
+    async def _on_getblocktxn(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        bhash = msg.get("hash")
+        indexes = msg.get("indexes", [])
+        if not is_hash(bhash) or not isinstance(indexes, list) or not all(isinstance(i, int) for i in indexes):
+            raise ValueError("bad getblocktxn")
+        if not self.state.has_block(bhash):
+            await peer.send({"type": "notfound", "items": [["block", bhash]]})
+            return
+        body = self.state.read_block(bhash)["body"]
+        txs = [body[i] for i in indexes if 0 <= i < len(body)]
+        await peer.send({"type": "blocktxn", "hash": bhash, "txs": txs})
+
+    async def _on_blocktxn(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        if not is_hash(msg.get("hash")) or not isinstance(msg.get("txs", []), list):
+            raise ValueError("bad blocktxn")
+        part = self.partial.pop(msg["hash"], None)
+        if part is None:
+            return
+        slots = part["slots"]
+        txs = iter(msg.get("txs", []))
+        for i in range(len(slots)):
+            if slots[i] is None:
+                slots[i] = next(txs, None)
+        await self._finish_compact(peer, msg["hash"], part["header"], slots)
+
+    async def _finish_compact(self, peer: Peer, bhash: str, header: Dict[str, Any],
+                              slots: List[Optional[Dict[str, Any]]]) -> None:
+        blk = {"header": header, "body": slots}
+        if None in slots or check_block(blk, bhash) is not None:
+            # short id collision or a bad peer: fall back to the full block
+            await self._request(peer, [["block", bhash]])
+            return
+        await self._handle_block(peer, blk)
+
+    # ---------- headers-first sync ----------
+
+    def locator(self) -> List[str]:
+        # hashes back from our best header: the last 10 one by one, then doubling gaps
+        out = []
+        e = self.state.best_header()
+        step = 1
+        while e is not None:
+            out.append(e.hash)
+            if len(out) >= 10:
+                step *= 2
+            for _ in range(step):
+                if e is None:
+                    break
+                e = e.parent
+        if self.active and self.active[0] not in out:
+            out.append(self.active[0])
+        return out
+
+    async def start_sync(self, peer: Peer) -> None:
+        await peer.send({"type": "getheaders", "locator": self.locator()})
+
+    async def _on_getheaders(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        # serve headers from our active chain, after the first locator hash we share
+        start = 0
+        for h in parse_hashes(msg.get("locator", [])):
+            e = self.state.index.get(h)
+            if e is not None and e.height < len(self.active) and self.active[e.height] == h:
+                start = e.height + 1
+                break
+        hashes = self.active[start:start + HEADERS_BATCH]
+        await peer.send({"type": "headers", "headers": [self.state.index[h].header for h in hashes]})
+
+    async def _on_headers(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        headers = msg.get("headers", [])
+        if not isinstance(headers, list):
+            raise ValueError("headers is not a list")
+        for header in headers:
+            if not isinstance(header, dict) or not isinstance(header.get("height"), int):
+                return
+            if self.state.index_header(header) is None:
+                print(f"[node {self.port}] bad header at height {header.get('height')} from {peer.addr}")
+                return
+            peer.height = max(peer.height, header["height"])
+        if len(headers) == HEADERS_BATCH:
+            await self.start_sync(peer)  # more to come
+        self._queue_missing_bodies()
+        await self.schedule_downloads()
+
+    def _queue_missing_bodies(self) -> None:
+        # windows of header-only entries above what was already walked; new
+        # headers only ever extend the top, so the walk stops at the first seen one
+        best = self.state.best_header()
+        missing = []
+        e = best
+        while e is not None and not e.linked and e.hash not in self.queued:
+            self.queued.add(e.hash)
+            if not e.has_body:
+                missing.append(e.hash)
+            e = e.parent
+        missing.reverse()
+        for i in range(0, len(missing), BLOCK_WINDOW):
+            self.download_queue.append(missing[i:i + BLOCK_WINDOW])
+
+    async def schedule_downloads(self) -> None:
+        progress = True
+        while self.download_queue and progress:
+            progress = False
+            for p in list(self.peers):
+                if not self.download_queue:
+                    break
+                slots = self.in_flight.setdefault(p, [])
+                if len(slots) >= WINDOWS_PER_PEER:
+                    continue
+                window = self.download_queue[0]
+                last = self.state.index.get(window[-1])
+                if last is None or p.height < last.height:
+                    continue
+                self.download_queue.pop(0)
+                slots.append(window)
+                await p.send({"type": "getblocks", "hashes": window})
+                progress = True
+
+    async def _on_getblocks(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        hashes = parse_hashes(msg.get("hashes", []))
+        blocks = [blk for blk in map(self._read_block, hashes) if blk is not None]
+        await peer.send({"type": "blocks", "hashes": hashes, "blocks": blocks})
+
+    async def _on_blocks(self, peer: Peer, msg: Dict[str, Any]) -> None:
+        window = parse_hashes(msg.get("hashes", []))
+        if not isinstance(msg.get("blocks", []), list):
+            raise ValueError("blocks is not a list")
+        old_tip = self.state.tip
+        for blk in msg.get("blocks", []):
+            self.accept_block(blk)
+        # retire the window this answered; anything it lacked is asked for again
+        slots = self.in_flight.get(peer, [])
+        if window in slots:
+            slots.remove(window)
+            missing = [h for h in window if not self.state.has_block(h)]
+            if missing:
+                self.download_queue.insert(0, missing)
+        if self.state.tip is not old_tip and self.state.tip is not None:
+            await self.relay([["block", self.state.tip.hash]], exclude=peer)
+        await self.schedule_downloads()
+
+
+def parse_peer(val: str) -> Tuple[str, int]:
+    host, _, port = val.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def run(args) -> None:
+    node = Node(args.dir, args.host, args.port, [parse_peer(p) for p in args.peer])
+    await node.start()
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await node.stop()
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Run a gossip node over a miner data dir.")
+    ap.add_argument("--dir", default=".", help="data dir holding Blocks/ and PendingTransactions/")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--peer", action="append", default=[], metavar="HOST:PORT")
+    args = ap.parse_args(argv)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+from typing import Callable, Dict, Any
+
+
+# --profile support for the miner and the wallets: run one work cycle under
+# cProfile and keep the result on disk, tagged with chain height and batch size.
+#
+#   python Block.py --profile 20 [--profile-dir profiles]
+#   python wallet_A/wallet.py --profile 5
+#
+# Per cycle, in the profile dir:
+#   <name>-<cycle>-h<height>-b<batch>.prof    pstats dump (python -m pstats, snakeviz,
+#                                             flameprof, gprof2dot)
+#   <name>-<cycle>-h<height>-b<batch>.folded  collapsed stacks for flamegraph.pl or
+#                                             speedscope, weights in microseconds
+#   profiles.jsonl                            one line per cycle: tags, wall time, files
+# cProfile keeps caller/callee pairs, not whole stacks, so the .folded stacks
+# are two frames deep (caller;callee, callee self time). Only the calling
+# thread is profiled; the RPC server threads are not.
+
+PROFILE_DIR = "profiles"
+MANIFEST = "profiles.jsonl"
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name  # built-ins: "<built-in method posix.listdir>"
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def write_folded(stats: pstats.Stats, path: str) -> None:
+    lines = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if not callers:
+            if int(tt * 1e6):
+                lines.append(f"{_label(func)} {int(tt * 1e6)}")
+            continue
+        for caller, edge in callers.items():
+            # edge = (cc, nc, tt, ct) for calls from this caller
+            if int(edge[2] * 1e6):
+                lines.append(f"{_label(caller)};{_label(func)} {int(edge[2] * 1e6)}")
+    with open(path, "w") as f:
+        f.write("\n".join(sorted(lines)) + "\n")
+
+
+def profile_cycle(cycle: Callable[[], Dict[str, Any]], name: str, number: int,
+                  out_dir: str = PROFILE_DIR) -> Dict[str, Any]:
+    # cycle() does one unit of work and returns its tags ({"height", "batch"})
+    os.makedirs(out_dir, exist_ok=True)
+    prof = cProfile.Profile()
+    t0 = time.perf_counter()
+    prof.enable()
+    try:
+        tags = cycle() or {}
+    finally:
+        prof.disable()
+    seconds = time.perf_counter() - t0
+
+    stem = f"{name}-{number:04d}-h{tags.get('height', 'na')}-b{tags.get('batch', 0)}"
+    stats = pstats.Stats(prof)
+    prof.dump_stats(os.path.join(out_dir, stem + ".prof"))
+    write_folded(stats, os.path.join(out_dir, stem + ".folded"))
+    record = {"name": name, "cycle": number, **tags, "seconds": round(seconds, 6),
+              "pid": os.getpid(), "time": int(time.time()),
+              "prof": stem + ".prof", "folded": stem + ".folded"}
+    with open(os.path.join(out_dir, MANIFEST), "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"[profile] {stem}: {seconds * 1000:.1f} ms -> {os.path.join(out_dir, stem)}.prof")
+    return tags
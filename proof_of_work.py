@@ -0,0 +1,188 @@
+import os
+import sys
+import time
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
+
+import jsonio
+
+
+# Optional proof-of-work for block headers.
+#
+# A PoW header carries "target" (64 hex chars) and "nonce" (int). It is valid
+# when sha256(canonical(header)) read as a big-endian integer is <= target; that
+# hash is also the block file name, so nothing else about the format changes.
+#
+# The canonical header is split once into prefix + <nonce digits> + suffix. Each
+# worker hashes the prefix a single time and then only feeds the nonce and the
+# short suffix into a copy of that sha256 state.
+
+# about 1 in 65536 hashes meets this (four leading zero hex digits); it is also
+# the easiest target retargeting is allowed to reach
+DEFAULT_TARGET = "0000" + "f" * 60
+POW_LIMIT = int(DEFAULT_TARGET, 16)
+
+# retargeting: every block looks at the timestamps of the last RETARGET_WINDOW
+# blocks and scales the parent's target so blocks come every TARGET_SPACING
+# seconds on average, moving at most MAX_ADJUST x per block
+RETARGET_WINDOW = 10
+TARGET_SPACING = 10
+MAX_ADJUST = 4
+MTP_WINDOW = 11  # a block's timestamp must be above the median of this many ancestors
+MAX_FUTURE_BLOCK_TIME = 2 * 60 * 60  # ...and at most this many seconds ahead of local time
+
+CHUNK_SIZE = 50_000  # nonces per pool task
+_NONCE_MARK = "__nonce__"
+
+_pool = None
+_pool_size = 0
+
+
+def canonical(obj) -> str:
+    return jsonio.canonical(obj)
+
+
+def header_hash(header: Dict[str, Any]) -> str:
+    return hashlib.sha256(canonical(header).encode()).hexdigest()
+
+
+def check_pow(header: Dict[str, Any]) -> bool:
+    # headers without a target are not PoW blocks and always pass
+    target = header.get("target")
+    if target is None:
+        return True
+    if not isinstance(target, str) or not isinstance(header.get("nonce"), int):
+        return False
+    try:
+        return int(header_hash(header), 16) <= int(target, 16)
+    except ValueError:
+        return False
+
+
+def next_target(prev_target: Optional[str], timestamps: List[int]) -> str:
+    # timestamps: oldest..newest of the most recent blocks (parent last)
+    if prev_target is None:
+        return DEFAULT_TARGET
+    target = int(prev_target, 16)
+    if len(timestamps) < 2:
+        return f"{target:064x}"
+    expected = TARGET_SPACING * (len(timestamps) - 1)
+    actual = timestamps[-1] - timestamps[0]
+    actual = max(expected // MAX_ADJUST, min(actual, expected * MAX_ADJUST))
+    target = min(target * actual // expected, POW_LIMIT)
+    return f"{max(target, 1):064x}"
+
+
+def median_time_past(timestamps: List[int]) -> int:
+    if not timestamps:
+        return 0
+    ordered = sorted(timestamps[-MTP_WINDOW:])
+    return ordered[len(ordered) // 2]
+
+
+def split_header(header: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    # canonical(header) == prefix + str(nonce) + suffix for every int nonce
+    marked = canonical({**header, "nonce": _NONCE_MARK})
+    prefix, suffix = marked.split(f'"{_NONCE_MARK}"')
+    return prefix.encode(), suffix.encode()
+
+
+def _search_chunk(args) -> Tuple[Optional[int], int]:
+    prefix, suffix, target, start, count = args
+    base = hashlib.sha256(prefix)
+    for nonce in range(start, start + count):
+        h = base.copy()
+        h.update(b"%d" % nonce + suffix)
+        if int.from_bytes(h.digest(), "big") <= target:
+            return nonce, nonce - start + 1
+    return None, count
+
+
+def get_pool(workers: int):
+    # one pool per process, reused across blocks
+    global _pool, _pool_size
+    if _pool is None or _pool_size != workers:
+        if _pool is not None:
+            _pool.terminate()
+        import multiprocessing  # only miners need it; every chainstate reader imports this module
+        _pool = multiprocessing.Pool(workers)
+        _pool_size = workers
+    return _pool
+
+
+def mine(header: Dict[str, Any], target: str = DEFAULT_TARGET,
+         workers: Optional[int] = None, start_nonce: int = 0) -> Dict[str, Any]:
+    # fill in header["target"] and header["nonce"]; returns hashrate stats
+    workers = workers or os.cpu_count() or 1
+    header["target"] = target
+    header.pop("nonce", None)
+    prefix, suffix = split_header(header)
+    target_int = int(target, 16)
+    pool = get_pool(workers) if workers > 1 else None
+
+    t0 = time.perf_counter()
+    hashes = 0
+    found = None
+    if pool is None:
+        nonce = start_nonce
+        while found is None:
+            found, done = _search_chunk((prefix, suffix, target_int, nonce, CHUNK_SIZE))
+            hashes += done
+            nonce += CHUNK_SIZE
+    else:
+        in_flight = []
+        next_start = start_nonce
+        # keep every worker busy without queueing an unbounded number of chunks
+        while found is None:
+            while len(in_flight) < workers * 2:
+                in_flight.append(pool.apply_async(
+                    _search_chunk, ((prefix, suffix, target_int, next_start, CHUNK_SIZE),)))
+                next_start += CHUNK_SIZE
+            nonce, done = in_flight.pop(0).get()
+            hashes += done
+            if nonce is not None:
+                found = nonce
+        # chunks still in flight finish in the background and are discarded
+
+    elapsed = time.perf_counter() - t0
+    header["nonce"] = found
+    return {
+        "nonce": found,
+        "hashes": hashes,
+        "seconds": elapsed,
+        "hashrate": hashes / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+    }
+
+
+def benchmark(seconds: float = 3.0, max_workers: Optional[int] = None) -> Dict[int, float]:
+    # hashes/sec for 1..max_workers processes against an unreachable target
+    import multiprocessing
+    max_workers = max_workers or os.cpu_count() or 1
+    header = {"height": 1, "timestamp": int(time.time()), "previousblock": "0" * 64,
+              "merkle_root": "0" * 64, "hash": "0" * 64, "target": "0" * 64}
+    prefix, suffix = split_header(header)
+    results = {}
+    for n in range(1, max_workers + 1):
+        with multiprocessing.Pool(n) as pool:
+            # warm up the workers so pool start-up is not measured
+            pool.map(_search_chunk, [(prefix, suffix, -1, 0, 1000)] * n)
+            hashes = 0
+            start = 0
+            t0 = time.perf_counter()
+            while time.perf_counter() - t0 < seconds:
+                batch = [(prefix, suffix, -1, start + i * CHUNK_SIZE, CHUNK_SIZE) for i in range(n)]
+                start += n * CHUNK_SIZE
+                for _nonce, done in pool.map(_search_chunk, batch):
+                    hashes += done
+            elapsed = time.perf_counter() - t0
+        results[n] = hashes / elapsed
+        print(f"{n:>3} worker(s): {results[n] / 1000:10.1f} kH/s  ({results[n] / 1000 / n:8.1f} kH/s per core)")
+    return results
+
+
+if __name__ == "__main__":
+    # python proof_of_work.py [seconds] [max_workers]
+    secs = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    maxw = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    benchmark(secs, maxw)
@@ -0,0 +1,178 @@
+import sys
+import time
+import hashlib
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+import store_db
+from chainstate import ChainState, BLOCKS_DIR
+from chain_index import normalize_hex
+from Block import validate_transaction
+
+
+# Chain -> store reconciler: keeps game_store.db's transactions table in step
+# with the confirmed chain in Blocks/.
+#
+#   python reconciler.py [--blocks-dir Blocks] [--db game_store.db] [--once]
+#
+# Follows the miner's active chain from the last checkpoint. Every tx whose
+# payer (input pubkey) or payee (output) is a user's wallet_address becomes a
+# row: "purchase" when the user paid, "refund" when the user was paid. Rows the
+# store already has (same tx_hash and user) get their addresses and
+# block_height updated. The rest are inserted only when the tx_hash belongs to
+# a store order for a priced game, taking that order's game_id and token_id;
+# payments the store never sold anything for are logged as unmatched and left
+# out. Blocks are checked as the miner checks them, minus the signatures, and
+# Blocks/ is only read. Each batch of blocks goes in with executemany inside
+# one commit, together with the new checkpoint, so a restart resumes exactly
+# where the last commit ended. On a reorg, rows above
+# the fork go back to block_height NULL (unconfirmed) and are re-stamped as
+# the new branch is replayed.
+
+BATCH_BLOCKS = 500
+POLL_INTERVAL = 5
+
+# store orders: tx_hash -> (game_id, token_id), for games that exist with a price
+SQL_ORDERS = (
+    "SELECT t.tx_hash, t.game_id, t.token_id FROM transactions t JOIN games g ON g.id = t.game_id "
+    "WHERE g.price_wei IS NOT NULL AND t.tx_hash IN ({marks}) "
+    "UNION ALL "
+    "SELECT ug.tx_hash, ug.game_id, ug.token_id FROM user_games ug JOIN games g ON g.id = ug.game_id "
+    "WHERE g.price_wei IS NOT NULL AND ug.tx_hash IN ({marks})")
+
+
+def address_from_pub(pub_pem: str) -> str:
+    # same derivation as Block.address_from_pub / the wallets
+    return hashlib.sha256(pub_pem.encode()).hexdigest()
+
+
+def validate_tx(tx, utxos, check_signatures=True):
+    # the miner verified the signatures before these blocks reached Blocks/
+    return validate_transaction(tx, utxos, check_signatures=False)
+
+
+def tx_rows(tx: Dict[str, Any], height: int, users: Dict[str, int]) -> List[tuple]:
+    # (user_id, from_address, to_address, type, tx_hash, block_height) per matched user
+    if not tx.get("inputs"):
+        return []  # coinbase
+    payer = address_from_pub(tx["inputs"][0]["pubkey"])
+    payees = [o["address"] for o in tx["body"].get("outputs", []) if o["address"] != payer]
+    tx_hash = "0x" + tx["txid"]
+    rows = []
+    if payer in users:
+        rows.append((users[payer], payer, payees[0] if payees else payer, "purchase", tx_hash, height))
+    for addr in dict.fromkeys(payees):
+        if addr in users and addr != payer:
+            rows.append((users[addr], payer, addr, "refund", tx_hash, height))
+    return rows
+
+
+class Reconciler:
+    def __init__(self, blocks_dir: str = BLOCKS_DIR, db_path: str = store_db.STORE_DB,
+                 batch_blocks: int = BATCH_BLOCKS):
+        self.state = ChainState(blocks_dir, validate_tx=validate_tx, persist_undo=False)
+        self.db = store_db.connect(db_path)
+        store_db.migrate(self.db)
+        self.batch_blocks = batch_blocks
+
+    def close(self) -> None:
+        self.db.close()
+
+    def checkpoint(self) -> Tuple[int, Optional[str]]:
+        rows = dict(self.db.execute("SELECT key, value FROM reconciler_state"))
+        return int(rows.get("height", -1)), rows.get("hash")
+
+    def _users(self) -> Dict[str, int]:
+        users = {}
+        for uid, wallet in self.db.execute(
+                "SELECT id, wallet_address FROM users WHERE wallet_address IS NOT NULL"):
+            users[normalize_hex(wallet)] = uid
+        return users
+
+    def _resume_height(self, chain) -> int:
+        # last checkpointed height still on the active chain
+        height, bhash = self.checkpoint()
+        if height < 0 or (height < len(chain) and chain[height].hash == bhash):
+            return height
+        old = self.state.index.get(bhash) if bhash else None
+        fork = self.state.fork_point(old, self.state.tip) if old is not None else None
+        fork_height = fork.height if fork is not None else -1
+        with self.db:
+            self.db.execute("UPDATE transactions SET block_height = NULL WHERE block_height > ?",
+                            (fork_height,))
+        print(f"[reconciler] reorg: rewinding from height {height} to {fork_height}")
+        return fork_height
+
+    def run_once(self) -> int:
+        # reconcile everything up to the current tip; returns blocks processed
+        self.state.refresh()
+        chain = self.state.active_chain()
+        height = self._resume_height(chain)
+        users = self._users()
+        done = 0
+        while height + 1 < len(chain):
+            batch = chain[height + 1:height + 1 + self.batch_blocks]
+            rows = []
+            for e in batch:
+                for tx in self.state.read_block(e.hash).get("body", []):
+                    if isinstance(tx, dict) and "txid" in tx and "body" in tx:
+                        rows.extend(tx_rows(tx, e.height, users))
+            self._write(rows, batch[-1])
+            height = batch[-1].height
+            done += len(batch)
+        return done
+
+    def _write(self, rows: List[tuple], last) -> None:
+        with self.db:
+            existing = set()
+            orders: Dict[str, tuple] = {}
+            hashes = list({r[4] for r in rows})
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                existing.update(self.db.execute(
+                    f"SELECT tx_hash, user_id FROM transactions WHERE tx_hash IN ({marks})", chunk))
+                for tx_hash, game_id, token_id in self.db.execute(SQL_ORDERS.format(marks=marks), chunk * 2):
+                    orders.setdefault(tx_hash, (game_id, token_id))
+            updates = [(r[1], r[2], r[5], r[4], r[0]) for r in rows if (r[4], r[0]) in existing]
+            inserts = [r[:1] + orders[r[4]] + r[1:] for r in rows
+                       if (r[4], r[0]) not in existing and r[4] in orders]
+            unmatched = [r for r in rows if (r[4], r[0]) not in existing and r[4] not in orders]
+            self.db.executemany(
+                "UPDATE transactions SET from_address = ?, to_address = ?, block_height = ? "
+                "WHERE tx_hash = ? AND user_id = ?", updates)
+            self.db.executemany(
+                "INSERT INTO transactions (user_id, game_id, token_id, from_address, to_address, type, "
+                "tx_hash, block_height) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", inserts)
+            self.db.executemany("INSERT OR REPLACE INTO reconciler_state VALUES (?, ?)",
+                                [("height", str(last.height)), ("hash", last.hash)])
+        if rows:
+            print(f"[reconciler] up to height {last.height}: {len(inserts)} inserted, {len(updates)} updated"
+                  + (f", {len(unmatched)} unmatched" if unmatched else ""))
+        for user_id, _payer, _payee, kind, tx_hash, height in unmatched:
+            print(f"[reconciler] unmatched {kind} {tx_hash} for user {user_id} at height {height}: no store order")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Stream confirmed blocks into game_store.db.")
+    ap.add_argument("--blocks-dir", default=BLOCKS_DIR)
+    ap.add_argument("--db", default=store_db.STORE_DB)
+    ap.add_argument("--batch-blocks", type=int, default=BATCH_BLOCKS)
+    ap.add_argument("--once", action="store_true", help="catch up and exit instead of tailing")
+    args = ap.parse_args(argv)
+
+    rec = Reconciler(args.blocks_dir, args.db, args.batch_blocks)
+    try:
+        while True:
+            rec.run_once()
+            if args.once:
+                break
+            time.sleep(POLL_INTERVAL)
+        print(f"reconciled up to height {rec.checkpoint()[0]}")
+    finally:
+        rec.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
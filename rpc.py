@@ -0,0 +1,414 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Callable
+
+from chainstate import (ChainState, UtxoView, TxReject, MALFORMED, DOUBLE_SPEND, ALREADY_PENDING,
+                        write_json_atomic, is_hash)
+from chain_index import ChainIndex
+import jsonio
+import metrics
+import txfiles
+
+
+# HTTP JSON-RPC 2.0 server embedded in the miner (RPC_PORT=8545 python Block.py).
+#
+#   POST /  {"jsonrpc": "2.0", "id": 1, "method": "get_balance", "params": {"address": "..."}}
+#   GET /metrics  miner stage timings and counters, Prometheus text format
+#
+# A JSON array of requests is a batch and gets an array of responses back in one
+# round trip. Connections are HTTP/1.1 keep-alive. Everything is answered from
+# the miner's in-memory ChainState plus the indexes below; only full block bodies
+# come from Blocks/, through a small LRU cache.
+#
+# methods (dashes also accepted, e.g. "get-block"):
+#   submit_tx   {"tx": {...}}                       -> {"txid", "accepted", "code", "reason"}
+#   get_block   {"height": N} | {"hash": "..."}      -> block
+#   get_tx      {"txid": "..."}                      -> {"tx", "block", "height", "status"}
+#   get_balance {"address": "..."}                   -> {"address", "balance"}
+#   get_utxos   {"address": "..."}                   -> [{"txid", "index", "value"}]
+#   get_tip     {}                                   -> {"height", "hash"}
+#   get_history {"address": "...", "limit"?, "cursor"?} -> {"items": [{"height", "txid", "delta"}], "next"}
+
+BLOCK_CACHE_SIZE = 256
+RESYNC_INTERVAL = 5.0  # seconds between rescans of PendingTransactions/ for files dropped in directly
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class TxIndex:
+    # txid -> (block hash, position) and address -> utxo keys for the active
+    # chain, kept current through ChainState listeners
+    def __init__(self, state: ChainState):
+        self.state = state
+        self.txs: Dict[str, tuple] = {}
+        self.by_address: Dict[str, set] = {}
+        self.owner: Dict[str, str] = {}  # utxo key -> address
+        for e in state.active_chain():
+            self.on_event("connect", e, state.read_block(e.hash))
+        state.listeners.append(self.on_event)
+
+    def _add_utxo(self, key: str, address: str) -> None:
+        self.owner[key] = address
+        self.by_address.setdefault(address, set()).add(key)
+
+    def _drop_utxo(self, key: str) -> None:
+        address = self.owner.pop(key, None)
+        if address is not None:
+            self.by_address.get(address, set()).discard(key)
+
+    def on_event(self, event: str, entry, blk: Dict[str, Any]) -> None:
+        txs = [tx for tx in blk["body"] if isinstance(tx, dict) and "txid" in tx and "body" in tx]
+        if event == "connect":
+            for pos, tx in enumerate(blk["body"]):
+                if isinstance(tx, dict) and "txid" in tx:
+                    self.txs[tx["txid"]] = (entry.hash, pos)
+            for tx in txs:
+                for inp in tx.get("inputs", []):
+                    self._drop_utxo(f"{inp['prev_txid']}:{inp['prev_index']}")
+                for i, outp in enumerate(tx["body"].get("outputs", [])):
+                    self._add_utxo(f"{tx['txid']}:{i}", outp["address"])
+        else:
+            # state.utxos has already been rolled back when this runs
+            for tx in reversed(txs):
+                self.txs.pop(tx["txid"], None)
+                for i in range(len(tx["body"].get("outputs", []))):
+                    self._drop_utxo(f"{tx['txid']}:{i}")
+                for inp in tx.get("inputs", []):
+                    key = f"{inp['prev_txid']}:{inp['prev_index']}"
+                    utxo = self.state.utxos.get(key)
+                    if utxo is not None:
+                        self._add_utxo(key, utxo["address"])
+
+    def utxos_of(self, address: str) -> List[Dict[str, Any]]:
+        out = []
+        for key in sorted(self.by_address.get(address, ())):
+            utxo = self.state.utxos.get(key)
+            if utxo is not None:
+                txid, idx = key.split(":")
+                out.append({"txid": txid, "index": int(idx), "value": utxo["value"]})
+        return out
+
+
+class Mempool:
+    # pending transactions as the RPC server sees them: the files in
+    # PendingTransactions/ plus a utxo view with their spends applied, so a
+    # second spend of the same output is refused at submission, not at block time
+    def __init__(self, state: ChainState, pending_dir: str,
+                 precheck_tx: Optional[Callable] = None, check_tx: Optional[Callable] = None):
+        self.state = state
+        self.pending_dir = pending_dir
+        self.precheck_tx = precheck_tx
+        self.check_tx = check_tx
+        self.txs: Dict[str, Dict[str, Any]] = {}
+        self.spent_by: Dict[str, str] = {}  # utxo key -> pending txid
+        self.view = UtxoView(state.utxos)
+        self._loaded: Dict[str, Optional[Dict[str, Any]]] = {}  # file txid -> tx (None if unusable)
+        self._tip = None
+        self._synced = None  # time.monotonic() of the last full sync
+
+    def _add(self, tx: Dict[str, Any]) -> None:
+        self.txs[tx["txid"]] = tx
+        for inp in tx["inputs"]:
+            self.spent_by[f"{inp['prev_txid']}:{inp['prev_index']}"] = tx["txid"]
+        self.view.apply(tx)
+
+    def _load(self, rel: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.pending_dir, rel), "rb") as f:
+                tx = jsonio.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.precheck_tx is not None and self.precheck_tx(tx) is not None:
+            return None  # the miner moves these to invalid/ on its next pass
+        return tx
+
+    def sync(self) -> None:
+        # wallets drop files in directly and the miner moves them out once mined;
+        # rebuild the view whenever either happened or the tip moved
+        files = {os.path.basename(rel)[:-5]: rel for rel in txfiles.iter_files(self.pending_dir)}
+        names = set(files)
+        for txid in list(self._loaded):
+            if txid not in names:
+                del self._loaded[txid]
+        if self._tip is not self.state.tip or any(txid not in names for txid in self.txs):
+            self.txs, self.spent_by = {}, {}
+            self.view = UtxoView(self.state.utxos)
+            self._tip = self.state.tip
+        for txid in sorted(names):  # same order the miner uses
+            if txid in self.txs:
+                continue
+            if txid not in self._loaded:
+                self._loaded[txid] = self._load(files[txid])
+            tx = self._loaded[txid]
+            if tx is not None and self._conflict(tx) is None and \
+                    (self.check_tx is None or self.check_tx(tx, self.view) is None):
+                self._add(tx)
+        self._synced = time.monotonic()
+
+    def refresh(self) -> None:
+        # submissions are added as they are written; a full rescan is only needed
+        # once the tip moved (the miner archived what it mined) or to pick up
+        # files wallets wrote on their own, which RESYNC_INTERVAL bounds
+        if self._tip is not self.state.tip or self._synced is None or \
+                time.monotonic() - self._synced >= RESYNC_INTERVAL:
+            self.sync()
+
+    def _conflict(self, tx: Dict[str, Any]) -> Optional[str]:
+        for inp in tx["inputs"]:
+            other = self.spent_by.get(f"{inp['prev_txid']}:{inp['prev_index']}")
+            if other is not None:
+                return TxReject(DOUBLE_SPEND, f"input {inp['prev_txid']}:{inp['prev_index']} "
+                                              f"already spent by pending tx {other}")
+        return None
+
+    def precheck(self, tx: Dict[str, Any]) -> Optional[str]:
+        # stateless part (structure, txid, signatures); needs no lock
+        try:
+            return self.precheck_tx(tx) if self.precheck_tx is not None else None
+        except Exception as e:
+            return TxReject(MALFORMED, f"malformed transaction: {e}")
+
+    def submit(self, tx: Dict[str, Any]) -> Optional[str]:
+        # stateful part against chain utxos + pending spends; caller holds the
+        # lock and has run precheck(). Returns the reject reason or None
+        self.refresh()
+        if tx["txid"] in self.txs:
+            return TxReject(ALREADY_PENDING, "already pending")
+        # a shape the checks did not foresee is the sender's problem, not a server error
+        try:
+            reason = self._conflict(tx)
+            if reason is None and self.check_tx is not None:
+                reason = self.check_tx(tx, self.view)
+        except Exception as e:
+            reason = TxReject(MALFORMED, f"malformed transaction: {e}")
+        if reason is not None:
+            return reason
+        # atomic so the miner never reads a half-written file; no fsync, as before
+        write_json_atomic(txfiles.path_for(self.pending_dir, tx["txid"], create=True), tx,
+                          fsync=False, indent=2)
+        self._loaded[tx["txid"]] = tx
+        self._add(tx)
+        return None
+
+
+class RpcService:
+    # precheck_tx(tx) and check_tx(tx, utxos) return a reject reason (ideally a
+    # chainstate.TxReject, whose .code is reported too) or None;
+    # the miner passes Block.check_tx_stateless / Block.check_tx_stateful.
+    # history is the miner's ChainIndex (get_history is unavailable without it)
+    def __init__(self, state: ChainState, pending_dir: str, lock: Optional[threading.RLock] = None,
+                 precheck_tx: Optional[Callable] = None, check_tx: Optional[Callable] = None,
+                 history: Optional[ChainIndex] = None):
+        self.state = state
+        self.history = history
+        self.pending_dir = pending_dir
+        self.lock = lock or threading.RLock()
+        self.mempool = Mempool(state, pending_dir, precheck_tx, check_tx)
+        self._blocks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        with self.lock:
+            self.index = TxIndex(state)
+            self.active: List[str] = [e.hash for e in state.active_chain()]
+            state.listeners.append(self._track_active)
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "submit_tx": self.submit_tx,
+            "get_block": self.get_block,
+            "get_tx": self.get_tx,
+            "get_balance": self.get_balance,
+            "get_utxos": self.get_utxos,
+            "get_tip": self.get_tip,
+            "get_history": self.get_history,
+        }
+        self.unlocked = {"submit_tx"}  # takes the lock itself, after signature checks
+
+    def _track_active(self, event: str, entry, blk: Dict[str, Any]) -> None:
+        del self.active[entry.height:]
+        if event == "connect":
+            self.active.append(entry.hash)
+            self._cache(entry.hash, blk)
+
+    def _cache(self, bhash: str, blk: Dict[str, Any]) -> None:
+        self._blocks[bhash] = blk
+        self._blocks.move_to_end(bhash)
+        while len(self._blocks) > BLOCK_CACHE_SIZE:
+            self._blocks.popitem(last=False)
+
+    def _block(self, bhash: str) -> Dict[str, Any]:
+        blk = self._blocks.get(bhash)
+        if blk is None:
+            blk = self.state.read_block(bhash)
+        self._cache(bhash, blk)
+        return blk
+
+    # ---------- methods ----------
+
+    def submit_tx(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # validated on the spot; a rejected tx never reaches PendingTransactions/
+        tx = params.get("tx")
+        if not isinstance(tx, dict) or not isinstance(tx.get("txid"), str):
+            raise RpcError(INVALID_PARAMS, "params.tx must be a transaction object")
+        reason = self.mempool.precheck(tx)
+        if reason is None:
+            with self.lock:
+                reason = self.mempool.submit(tx)
+        code = None if reason is None else getattr(reason, "code", "invalid")
+        return {"txid": tx["txid"], "accepted": reason is None, "code": code, "reason": reason}
+
+    def get_block(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if "hash" in params:
+            bhash = params["hash"]
+            if not is_hash(bhash):
+                raise RpcError(INVALID_PARAMS, "params.hash must be 64 lowercase hex digits")
+            if not self.state.has_block(bhash):
+                raise RpcError(SERVER_ERROR, "block not found")
+        elif isinstance(params.get("height"), int):
+            h = params["height"]
+            if not 0 <= h < len(self.active):
+                raise RpcError(SERVER_ERROR, "no block at that height")
+            bhash = self.active[h]
+        else:
+            raise RpcError(INVALID_PARAMS, "give either hash or height")
+        return {"hash": bhash, **self._block(bhash)}
+
+    def get_tx(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        txid = params.get("txid")
+        if not is_hash(txid):
+            # it becomes a file name under PendingTransactions/
+            raise RpcError(INVALID_PARAMS, "params.txid must be 64 lowercase hex digits")
+        loc = self.index.txs.get(txid)
+        if loc is not None:
+            bhash, pos = loc
+            return {"tx": self._block(bhash)["body"][pos], "block": bhash,
+                    "height": self.state.index[bhash].height, "status": "confirmed"}
+        path = txfiles.locate(self.pending_dir, txid)
+        if path is not None:
+            with open(path, "rb") as f:
+                return {"tx": jsonio.load(f), "block": None, "height": None, "status": "pending"}
+        raise RpcError(SERVER_ERROR, "transaction not found")
+
+    def get_balance(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        address = params.get("address")
+        if not isinstance(address, str):
+            raise RpcError(INVALID_PARAMS, "params.address is required")
+        return {"address": address, "balance": sum(u["value"] for u in self.index.utxos_of(address))}
+
+    def get_utxos(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        address = params.get("address")
+        if not isinstance(address, str):
+            raise RpcError(INVALID_PARAMS, "params.address is required")
+        return self.index.utxos_of(address)
+
+    def get_tip(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        tip = self.state.tip
+        return {"height": tip.height if tip else -1, "hash": tip.hash if tip else None}
+
+    def get_history(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        address = params.get("address")
+        limit = params.get("limit", 50)
+        if not isinstance(address, str):
+            raise RpcError(INVALID_PARAMS, "params.address is required")
+        if not isinstance(limit, int) or not 0 < limit <= 1000:
+            raise RpcError(INVALID_PARAMS, "params.limit must be 1..1000")
+        if self.history is None:
+            raise RpcError(SERVER_ERROR, "history index not enabled (CHAIN_INDEX)")
+        items, nxt = self.history.history(address, limit, params.get("cursor"))
+        return {"items": items, "next": nxt}
+
+    # ---------- dispatch ----------
+
+    def call(self, req: Any) -> Optional[Dict[str, Any]]:
+        # one JSON-RPC request -> response (None for notifications)
+        if not isinstance(req, dict) or not isinstance(req.get("method"), str):
+            return error_response(None, INVALID_REQUEST, "invalid request")
+        req_id = req.get("id")
+        fn = self.methods.get(req["method"].replace("-", "_"))
+        if fn is None:
+            return error_response(req_id, METHOD_NOT_FOUND, f"unknown method {req['method']}")
+        params = req.get("params") or {}
+        if not isinstance(params, dict):
+            return error_response(req_id, INVALID_PARAMS, "params must be an object")
+        try:
+            if req["method"].replace("-", "_") in self.unlocked:
+                result = fn(params)
+            else:
+                with self.lock:
+                    result = fn(params)
+        except RpcError as e:
+            return error_response(req_id, e.code, e.message)
+        except Exception as e:
+            return error_response(req_id, SERVER_ERROR, str(e))
+        if "id" not in req:
+            return None
+        return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+    def handle(self, payload: Any) -> Any:
+        if isinstance(payload, list):
+            if not payload:
+                return error_response(None, INVALID_REQUEST, "empty batch")
+            out = [r for r in (self.call(req) for req in payload) if r is not None]
+            return out or None
+        return self.call(payload)
+
+
+def error_response(req_id, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": req_id, "error": {"code": code, "message": message}}
+
+
+class RpcHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    service: RpcService = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        try:
+            payload = jsonio.loads(raw)
+        except ValueError:
+            resp = error_response(None, PARSE_ERROR, "parse error")
+        else:
+            resp = self.service.handle(payload)
+        self._reply(resp)
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.REGISTRY.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply(self, resp: Any) -> None:
+        body = b"" if resp is None else jsonio.compact(resp).encode()
+        self.send_response(200 if resp is not None else 204)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass  # the miner already prints plenty
+
+
+def start_server(service: RpcService, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    handler = type("BoundRpcHandler", (RpcHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[rpc] listening on http://{host}:{server.server_address[1]}/")
+    return server
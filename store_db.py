@@ -0,0 +1,162 @@
+import queue
+import sqlite3
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
+
+
+# Data access for game_store.db (the store server's database).
+#
+#   pool = StorePool("game_store.db")
+#   pool.entitlement(user_id, game_id)
+#
+# Opening a pool brings the schema up to date: each migration below runs once,
+# tracked in PRAGMA user_version, and adds the secondary indexes the hot
+# lookups need. Connections run in WAL mode so readers don't block the server's
+# writes. Every query is a fixed SQL string with bound parameters, so sqlite3's
+# per-connection statement cache prepares it once and reuses it.
+
+STORE_DB = "game_store.db"
+POOL_SIZE = 4
+STATEMENT_CACHE = 64
+
+MIGRATIONS = [
+    # 1: covering indexes for entitlement, library, history, friend and share lookups
+    [
+        "CREATE INDEX IF NOT EXISTS user_games_by_user_game ON user_games (user_id, game_id, tx_hash, token_id)",
+        "CREATE INDEX IF NOT EXISTS transactions_by_tx_hash ON transactions (tx_hash)",
+        "CREATE INDEX IF NOT EXISTS transactions_by_user ON transactions (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS friends_by_user ON friends (user_id, friend_id)",
+        "CREATE INDEX IF NOT EXISTS game_shares_by_hash ON game_shares (share_hash)",
+        "CREATE INDEX IF NOT EXISTS game_shares_by_friend ON game_shares (friend_id, game_id, owner_id)",
+        "CREATE INDEX IF NOT EXISTS users_by_wallet ON users (wallet_address)",
+    ],
+    # 2: chain reconciler (reconciler.py): confirmation height + resume checkpoint
+    [
+        "ALTER TABLE transactions ADD COLUMN block_height INTEGER",
+        "CREATE TABLE IF NOT EXISTS reconciler_state (key TEXT PRIMARY KEY, value TEXT)",
+    ],
+]
+
+SQL_ENTITLEMENT = (
+    "SELECT id, token_id, tx_hash FROM user_games "
+    "WHERE user_id = ? AND game_id = ? ORDER BY id DESC LIMIT 1")
+SQL_PURCHASE = (
+    "SELECT ug.tx_hash, u.wallet_address, g.name FROM user_games ug "
+    "JOIN users u ON u.id = ug.user_id LEFT JOIN games g ON g.id = ug.game_id "
+    "WHERE ug.user_id = ? AND ug.game_id = ? AND ug.tx_hash IS NOT NULL "
+    "ORDER BY ug.id DESC LIMIT 1")
+SQL_LIBRARY = (
+    "SELECT g.id, g.name, ug.token_id, ug.acquired_via, ug.tx_hash FROM user_games ug "
+    "JOIN games g ON g.id = ug.game_id WHERE ug.user_id = ? ORDER BY ug.id")
+SQL_FRIENDS = (
+    "SELECT u.id, u.username, u.wallet_address FROM friends f "
+    "JOIN users u ON u.id = f.friend_id WHERE f.user_id = ? ORDER BY u.id")
+SQL_SHARED_WITH = (
+    "SELECT owner_id, share_hash FROM game_shares WHERE friend_id = ? AND game_id = ? LIMIT 1")
+SQL_SHARE = "SELECT owner_id, friend_id, game_id FROM game_shares WHERE share_hash = ?"
+SQL_PASSWORD_HASH = "SELECT password_hash FROM users WHERE username = ?"
+SQL_TX_BY_HASH = (
+    "SELECT id, user_id, game_id, token_id, from_address, to_address, type, created_at "
+    "FROM transactions WHERE tx_hash = ?")
+SQL_USER_TXS = (
+    "SELECT tx_hash, game_id, type, created_at FROM transactions "
+    "WHERE user_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?")
+
+
+def connect(path: str = STORE_DB, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    # apply pending migrations; returns the schema version
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for i, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            for sql in steps:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {i}")
+        conn.execute("ANALYZE")
+    return max(version, len(MIGRATIONS))
+
+
+class StorePool:
+    def __init__(self, path: str = STORE_DB, size: int = POOL_SIZE, readonly: bool = False):
+        self.path = path
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        first = connect(path, readonly)
+        if not readonly:
+            migrate(first)
+        self._idle.put(first)
+        for _ in range(size - 1):
+            self._idle.put(connect(path, readonly))
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+    def _one(self, sql: str, params: tuple) -> Optional[tuple]:
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def _all(self, sql: str, params: tuple) -> List[tuple]:
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    # ---------- queries ----------
+
+    def entitlement(self, user_id: int, game_id: int) -> Optional[Dict[str, Any]]:
+        row = self._one(SQL_ENTITLEMENT, (user_id, game_id))
+        if row is None:
+            return None
+        return {"id": row[0], "token_id": row[1], "tx_hash": row[2]}
+
+    def purchase(self, user_id: int, game_id: int) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+        # (tx_hash, wallet_address, game name) of the latest purchase
+        return self._one(SQL_PURCHASE, (user_id, game_id))
+
+    def library(self, user_id: int) -> List[Dict[str, Any]]:
+        return [{"game_id": r[0], "name": r[1], "token_id": r[2], "acquired_via": r[3], "tx_hash": r[4]}
+                for r in self._all(SQL_LIBRARY, (user_id,))]
+
+    def friends(self, user_id: int) -> List[Dict[str, Any]]:
+        return [{"id": r[0], "username": r[1], "wallet_address": r[2]}
+                for r in self._all(SQL_FRIENDS, (user_id,))]
+
+    def shared_with(self, friend_id: int, game_id: int) -> Optional[Dict[str, Any]]:
+        row = self._one(SQL_SHARED_WITH, (friend_id, game_id))
+        return {"owner_id": row[0], "share_hash": row[1]} if row else None
+
+    def share(self, share_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._one(SQL_SHARE, (share_hash,))
+        return {"owner_id": row[0], "friend_id": row[1], "game_id": row[2]} if row else None
+
+    def password_hash(self, username: str) -> Optional[str]:
+        # the stored hash; it changes whenever the password does
+        row = self._one(SQL_PASSWORD_HASH, (username,))
+        return row[0] if row else None
+
+    def transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._one(SQL_TX_BY_HASH, (tx_hash,))
+        if row is None:
+            return None
+        keys = ("id", "user_id", "game_id", "token_id", "from_address", "to_address", "type", "created_at")
+        return dict(zip(keys, row))
+
+    def user_transactions(self, user_id: int, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        return [{"tx_hash": r[0], "game_id": r[1], "type": r[2], "created_at": r[3]}
+                for r in self._all(SQL_USER_TXS, (user_id, limit, offset))]
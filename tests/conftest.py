@@ -0,0 +1,41 @@
+import os
+import sys
+import hashlib
+from typing import List, Dict, Any, Tuple
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from chainstate import canonical, merkle_root, block_hash, write_json_atomic
+import jsonio
+
+
+# Unsigned blocks in the on-disk format, for ChainState tests that do not need
+# RSA: a ChainState without validate_tx only checks structure and linkage.
+
+def make_tx(inputs: List[Tuple[str, int]], outputs: List[Tuple[str, int]], nonce: int = 0) -> Dict[str, Any]:
+    body = {"timestamp": nonce,
+            "inputs": [{"prev_txid": t, "prev_index": i} for t, i in inputs],
+            "outputs": [{"address": a, "value": v} for a, v in outputs]}
+    return {"txid": hashlib.sha256(canonical(body).encode()).hexdigest(), "body": body,
+            "inputs": [{"prev_txid": t, "prev_index": i, "pubkey": "", "signature": ""} for t, i in inputs]}
+
+
+def make_block(height: int, prev: str, body: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    header = {"height": height, "timestamp": 1_700_000_000 + height, "previousblock": prev,
+              "merkle_root": merkle_root([tx["txid"] for tx in body]),
+              "hash": hashlib.sha256(jsonio.compact(body).encode()).hexdigest()}
+    return block_hash(header), {"header": header, "body": body}
+
+
+def write_block(blocks_dir: str, bhash: str, blk: Dict[str, Any]) -> None:
+    write_json_atomic(os.path.join(blocks_dir, bhash + ".json"), blk, fsync=False, indent=2)
+
+
+@pytest.fixture
+def blocks_dir(tmp_path):
+    d = tmp_path / "Blocks"
+    d.mkdir()
+    return str(d)
@@ -0,0 +1,97 @@
+import os
+import sys
+import importlib
+import subprocess
+
+import pytest
+
+import txfiles
+from block_journal import BlockJournal
+from chainstate import atomic_tmp_path
+from conftest import ROOT, make_tx, make_block, write_block
+
+
+@pytest.fixture
+def miner(tmp_path, monkeypatch):
+    # Block.py works on ./Blocks, ./PendingTransactions, ./ProcessedTransactions
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CHAIN_INDEX", "")
+    Block = importlib.import_module("Block")
+    for d in (Block.BLOCKS_DIR, Block.PENDING_DIR, os.path.join(Block.PROCESSED_DIR, "invalid")):
+        os.makedirs(d, exist_ok=True)
+    monkeypatch.setattr(Block, "FSYNC", False)
+    monkeypatch.setattr(Block, "journal", BlockJournal(str(tmp_path / "block_journal.log"), fsync=False))
+    return Block
+
+
+def pending(Block, n):
+    files = []
+    for i in range(n):
+        tx = make_tx([], [("alice", i)], nonce=i)
+        with open(txfiles.path_for(Block.PENDING_DIR, tx["txid"], create=True), "w") as f:
+            f.write("{}")
+        files.append(txfiles.rel_path(tx["txid"] + ".json"))
+    return files
+
+
+def restart(Block):
+    # what a new miner process sees: the same journal file, a fresh handle
+    Block.journal.close()
+    Block.journal = BlockJournal(Block.journal.path, fsync=False)
+
+
+def test_torn_block_write_leaves_transactions_pending(miner):
+    files = pending(miner, 3)
+    bhash, _blk = make_block(1, "0" * 64, [])
+    path = os.path.join(miner.BLOCKS_DIR, bhash + ".json")
+    miner.journal.begin(bhash, 1, files, tmp=atomic_tmp_path(path))
+    with open(atomic_tmp_path(path), "w") as f:
+        f.write('{"header": {"hei')  # crash mid-write
+    other = os.path.join(miner.BLOCKS_DIR, "f" * 64 + ".json.99999.tmp")
+    with open(other, "w") as f:
+        f.write("{")  # another miner's write in flight
+
+    restart(miner)
+    miner.recover_journal()
+
+    assert not os.path.exists(atomic_tmp_path(path))
+    assert os.path.exists(other)
+    assert not os.path.exists(path)
+    assert sorted(txfiles.list_sorted(miner.PENDING_DIR)) == sorted(files)
+    assert miner.journal.incomplete() == []
+
+
+def test_committed_block_is_archived_on_recovery(miner):
+    files = pending(miner, 3)
+    bhash, blk = make_block(1, "0" * 64, [])
+    write_block(miner.BLOCKS_DIR, bhash, blk)  # the rename happened, the archiving did not
+    miner.journal.begin(bhash, 1, files, tmp=atomic_tmp_path(os.path.join(miner.BLOCKS_DIR, bhash + ".json")))
+
+    restart(miner)
+    miner.recover_journal()
+
+    assert txfiles.list_sorted(miner.PENDING_DIR) == []
+    seg = os.path.join(miner.PROCESSED_DIR, bhash + miner.SEGMENT_SUFFIX)
+    with open(seg) as f:
+        assert f.read().count(".json") == len(files)
+    assert miner.journal.incomplete() == []
+
+    miner.recover_journal()  # nothing left to redo
+    assert os.path.exists(seg)
+
+
+def test_torn_journal_line_is_not_a_commit(tmp_path):
+    j = BlockJournal(str(tmp_path / "block_journal.log"), fsync=False)
+    j.begin("a" * 64, 1, ["x.json"])
+    j.close()
+    with open(j.path, "a") as f:
+        f.write('{"op":"begin","block":"bbb')
+    assert [r["block"] for r in j.incomplete()] == ["a" * 64]
+
+
+def test_importing_block_creates_no_dirs(tmp_path):
+    # node.py, reconciler.py and validate_chain.py import the validators from it
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    subprocess.run([sys.executable, "-c", "import Block, node, reconciler, validate_chain"],
+                   cwd=tmp_path, env=env, check=True)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+
+from chainstate import ChainState
+from chain_index import ChainIndex, SCHEMA_VERSION
+from conftest import make_tx, make_block, write_block
+
+
+def build(blocks_dir, n):
+    prev, chain = "NA", []
+    for h in range(n):
+        prev, blk = make_block(h, prev, [make_tx([], [("alice", 50)], nonce=h)])
+        write_block(blocks_dir, prev, blk)
+        chain.append((prev, blk))
+    return chain
+
+
+def miner_index(tmp_path, blocks_dir):
+    state = ChainState(blocks_dir, persist_undo=False)
+    state.load()
+    index = ChainIndex(str(tmp_path / "chain_index.db"), blocks_dir)
+    index.attach(state)
+    return state, index
+
+
+def test_reader_never_creates_or_migrates(tmp_path, blocks_dir):
+    db = str(tmp_path / "chain_index.db")
+    sqlite3.connect(db).close()  # empty file, no schema
+    reader = ChainIndex(db, blocks_dir, readonly=True)
+    assert reader.is_stale()
+    reader.close()
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT name FROM sqlite_master").fetchall() == []
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    conn.close()
+
+
+def test_stale_only_when_a_higher_block_arrives(tmp_path, blocks_dir):
+    chain = build(blocks_dir, 3)
+    state, index = miner_index(tmp_path, blocks_dir)
+    reader = ChainIndex(index.db_path, blocks_dir, readonly=True)
+    assert not reader.is_stale()
+
+    # undo/temp files and a side branch below the tip do not matter
+    with open(os.path.join(blocks_dir, "x.undo"), "w") as f:
+        f.write("{}")
+    side, blk = make_block(1, chain[0][0], [make_tx([], [("bob", 1)], nonce=99)])
+    write_block(blocks_dir, side, blk)
+    assert not reader.is_stale()
+
+    top, blk = make_block(3, chain[-1][0], [make_tx([], [("carol", 1)], nonce=3)])
+    write_block(blocks_dir, top, blk)
+    assert reader.is_stale()
+
+    state.refresh()
+    assert index.tip() == (3, top)
+    assert not reader.is_stale()
+    reader.close()
+    index.close()
+
+
+def test_rebuild_clears_meta(tmp_path, blocks_dir):
+    build(blocks_dir, 2)
+    _state, index = miner_index(tmp_path, blocks_dir)
+    with index.db:
+        index.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION - 1}")
+    index.close()
+    index = ChainIndex(index.db_path, blocks_dir)  # migrates: rebuild on next attach()
+    assert index.db.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0
+    assert index.is_stale()
+    index.close()
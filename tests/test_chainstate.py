@@ -0,0 +1,168 @@
+import os
+import hashlib
+
+import pytest
+
+import proof_of_work
+from chainstate import ChainState, canonical, connect_block, block_hash_of
+from conftest import make_tx, make_block, write_block
+
+
+def build_branches(blocks_dir):
+    # genesis, then branch A (4 blocks) and branch B (5 blocks) spending the same coins
+    coinbase = make_tx([], [("alice", 50), ("bob", 50)])
+    g, genesis = make_block(0, "NA", [coinbase])
+    a, b = [(g, genesis)], [(g, genesis)]
+    prev_a = prev_b = g
+    spend_a, spend_b = (coinbase["txid"], 0), (coinbase["txid"], 1)
+    for h in range(1, 5):
+        tx = make_tx([spend_a], [("carol", 10), ("alice", 40 - h)], nonce=h)
+        prev_a, blk = make_block(h, prev_a, [tx])
+        a.append((prev_a, blk))
+        spend_a = (tx["txid"], 1)
+    for h in range(1, 6):
+        inputs = [spend_b] + ([(coinbase["txid"], 0)] if h == 1 else [])
+        tx = make_tx(inputs, [("dave", 5), ("bob", 45 + (50 if h == 1 else 0) - h)], nonce=100 + h)
+        prev_b, blk = make_block(h, prev_b, [tx])
+        b.append((prev_b, blk))
+        spend_b = (tx["txid"], 1)
+    return a, b
+
+
+def replay(branch):
+    utxos = {}
+    for _bhash, blk in branch:
+        connect_block(utxos, blk)
+    return utxos
+
+
+def add_all(state, blocks_dir, branch):
+    for bhash, blk in branch:
+        if not state.has_block(bhash):
+            write_block(blocks_dir, bhash, blk)
+            state.add_block(blk, bhash)
+
+
+@pytest.mark.parametrize("persist_undo", [True, False])
+def test_reorg_round_trip_matches_full_rebuild(blocks_dir, persist_undo):
+    a, b = build_branches(blocks_dir)
+    state = ChainState(blocks_dir, persist_undo=persist_undo)
+    add_all(state, blocks_dir, a)
+    assert state.tip.hash == a[-1][0]
+    assert state.utxos == replay(a)
+
+    add_all(state, blocks_dir, b)  # 4 out, 5 in
+    assert state.tip.hash == b[-1][0]
+    assert state.utxos == replay(b)
+
+    # and back: A grows to 6 blocks and wins again
+    tx = make_tx([], [("erin", 1)], nonce=7)
+    a5 = make_block(5, a[-1][0], [tx])
+    a6 = make_block(6, a5[0], [make_tx([], [("erin", 2)], nonce=8)])
+    add_all(state, blocks_dir, [a5, a6])
+    assert state.tip.hash == a6[0]
+    assert state.utxos == replay(a + [a5, a6])
+
+    rebuilt = ChainState(blocks_dir, persist_undo=False)
+    rebuilt.load()
+    assert rebuilt.tip.hash == state.tip.hash
+    assert rebuilt.utxos == state.utxos
+
+
+def test_undo_files_are_not_rewritten_on_load(blocks_dir):
+    _a, b = build_branches(blocks_dir)
+    state = ChainState(blocks_dir)
+    add_all(state, blocks_dir, b)
+    undo = {f: os.stat(os.path.join(blocks_dir, f)).st_mtime_ns
+            for f in os.listdir(blocks_dir) if f.endswith(".undo")}
+    assert len(undo) == len(b)
+
+    ChainState(blocks_dir).load()
+    reader = ChainState(blocks_dir, persist_undo=False)
+    reader.load()
+    assert reader.utxos == replay(b)
+    after = {f: os.stat(os.path.join(blocks_dir, f)).st_mtime_ns
+             for f in os.listdir(blocks_dir) if f.endswith(".undo")}
+    assert after == undo
+
+
+def test_reader_writes_nothing_to_blocks_dir(blocks_dir):
+    _a, b = build_branches(blocks_dir)
+    for bhash, blk in b:
+        write_block(blocks_dir, bhash, blk)
+    before = sorted(os.listdir(blocks_dir))
+    reader = ChainState(blocks_dir, persist_undo=False)
+    reader.load()
+    assert reader.tip.hash == b[-1][0]
+    assert sorted(os.listdir(blocks_dir)) == before
+
+
+def bad_outputs_tx(nonce):
+    # a txid that matches its body, but an output that is not an object
+    body = {"timestamp": nonce, "inputs": [], "outputs": [5]}
+    return {"txid": hashlib.sha256(canonical(body).encode()).hexdigest(), "body": body, "inputs": []}
+
+
+def test_malformed_block_on_first_load_is_skipped(blocks_dir):
+    coinbase = make_tx([], [("alice", 50)])
+    g, genesis = make_block(0, "NA", [coinbase])
+    b1 = make_block(1, g, [make_tx([], [("bob", 1)], nonce=1), bad_outputs_tx(2)])
+    for bhash, blk in [(g, genesis), b1]:
+        write_block(blocks_dir, bhash, blk)
+
+    state = ChainState(blocks_dir)
+    state.load()
+    assert state.tip.hash == g
+    assert state.index[b1[0]].invalid
+    assert state.utxos == replay([(g, genesis)])
+    state.refresh()  # no longer raises on every pass
+    assert state.tip.hash == g
+
+
+def test_malformed_block_mid_reorg_restores_old_branch(blocks_dir):
+    a, b = build_branches(blocks_dir)
+    state = ChainState(blocks_dir)
+    add_all(state, blocks_dir, a)
+
+    bad = b[:-1] + [make_block(5, b[-2][0], [make_tx([], [("x", 1)], nonce=9), bad_outputs_tx(10)])]
+    add_all(state, blocks_dir, bad)
+    assert state.tip.hash == a[-1][0]
+    assert state.utxos == replay(a)
+    assert state.index[bad[-1][0]].invalid
+
+
+def test_future_pow_block_is_retried_not_dropped(blocks_dir, monkeypatch):
+    coinbase = make_tx([], [("alice", 50)])
+    g, genesis = make_block(0, "NA", [coinbase])
+    genesis["header"]["timestamp"] = 1_700_000_000 + proof_of_work.MAX_FUTURE_BLOCK_TIME + 60
+    proof_of_work.mine(genesis["header"], workers=1)
+    g = block_hash_of(genesis)
+    write_block(blocks_dir, g, genesis)
+
+    monkeypatch.setattr("time.time", lambda: 1_700_000_000)
+    state = ChainState(blocks_dir)
+    state.load()
+    assert state.tip is None
+
+    monkeypatch.setattr("time.time", lambda: 1_700_000_000 + 120)
+    state.refresh()
+    assert state.tip.hash == g
+
+
+
+@pytest.mark.parametrize("stamp", ["1700000000", None, True])
+def test_header_without_a_numeric_timestamp_is_refused(blocks_dir, stamp):
+    g, genesis = make_block(0, "NA", [make_tx([], [("alice", 50)])])
+    genesis["header"]["timestamp"] = stamp
+    proof_of_work.mine(genesis["header"], workers=1)
+    g = block_hash_of(genesis)
+    _c, child = make_block(1, g, [make_tx([], [("bob", 1)], nonce=1)])
+    proof_of_work.mine(child["header"], workers=1)  # its median-time-past would see the bad stamp
+    for blk in (genesis, child):
+        write_block(blocks_dir, block_hash_of(blk), blk)
+
+    state = ChainState(blocks_dir)
+    state.load()
+    assert state.tip is None and g not in state.index
+    state.refresh()
+    assert state.tip is None
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import jsonio
+from conftest import make_tx, make_block
+
+
+# Every jsonio encoder must give the exact bytes of the json.dumps() call it
+# replaces (txids and block hashes are hashes of them), on either backend.
+
+EDGE_CASES = [
+    {}, [], "", 0, -1, True, False, None, 2 ** 63 - 1, 2 ** 64, -2 ** 63, 10 ** 30,
+    {"b": 1, "a": [1, 2, {"d": None, "c": ""}]}, {"": 0, "A": 1, "a": 2, "_": 3, "~": 4},
+    {"emptys": [[], {}, [[]], [{}]]}, "quote\" backslash\\ slash/ tab\t nl\n cr\r bs\b ff\f",
+    "".join(chr(c) for c in range(32)) + "\x7f", "café ünïcødé", "  ", "😀",
+    {"é": 1, "e": 2}, {1: "int key"}, [1.0, 0.1, 1e16, 1e-05, -0.0, 1.5e300, 1700000000.123],
+    float("nan"), float("inf"), (1, 2), {"nested": [[[[[[{"deep": True}]]]]]]},
+    make_tx([("ab" * 32, 0)], [("alice", 50), ("bob", 10 ** 20)], nonce=7),
+    make_block(3, "cd" * 32, [make_tx([], [("carol", 25)], nonce=3)])[1],
+]
+
+ENCODERS = [
+    ("canonical", jsonio.canonical, lambda o: json.dumps(o, separators=(',', ':'), sort_keys=True)),
+    ("compact", jsonio.compact, lambda o: json.dumps(o, separators=(',', ':'))),
+    ("indent2", lambda o: jsonio.dumps(o, indent=2), lambda o: json.dumps(o, indent=2)),
+    ("sorted_compact", lambda o: jsonio.dumps(o, separators=(',', ':'), sort_keys=True),
+     lambda o: json.dumps(o, separators=(',', ':'), sort_keys=True)),
+]
+
+
+@pytest.fixture(params=["json", "orjson"])
+def backend(request, monkeypatch):
+    if request.param == "orjson" and jsonio.orjson is None:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(jsonio, "_fast", request.param == "orjson")
+    return request.param
+
+
+@pytest.mark.parametrize("obj", EDGE_CASES)
+@pytest.mark.parametrize("name, ours, ref", ENCODERS, ids=[e[0] for e in ENCODERS])
+def test_encoders_match_json_dumps(backend, obj, name, ours, ref):
+    try:
+        expected = ref(obj)
+    except (TypeError, ValueError):
+        pytest.skip("json.dumps refuses it too")
+    assert ours(obj) == expected
+
+
+@pytest.mark.parametrize("obj", EDGE_CASES)
+def test_loads_matches_json_loads(backend, obj):
+    text = json.dumps(obj)
+    # repr: NaN != NaN, and 1 == 1.0 would hide a float
+    assert repr(jsonio.loads(text)) == repr(json.loads(text))
+    assert repr(jsonio.loads(text.encode())) == repr(json.loads(text))
+
+
+@pytest.mark.parametrize("text", ["1234567890123456789", "[-1234567890123456789012]",
+                                  '{"v": 12345678901234567890}', '"12345678901234567890"'])
+def test_loads_keeps_big_ints_exact(backend, text):
+    assert repr(jsonio.loads(text)) == repr(json.loads(text))
@@ -0,0 +1,24 @@
+import pytest
+
+from metrics import Metrics, PREFIX
+
+
+@pytest.mark.parametrize("value, text", [
+    (1234567, "1234567"),
+    (2 ** 53 + 1, "9007199254740993"),
+    (0.1, "0.1"),
+    (1234567.25, "1234567.25"),
+    (float("inf"), "+Inf"),
+    (float("nan"), "NaN"),
+])
+def test_prometheus_values_are_exact(value, text):
+    m = Metrics()
+    m.set_gauge("g", value)
+    assert f"{PREFIX}g {text}\n" in m.prometheus()
+
+
+def test_counter_keeps_counting_past_a_million():
+    m = Metrics()
+    m.inc("txs_total", 1_000_000)
+    m.inc("txs_total", 7)
+    assert f"{PREFIX}txs_total 1000007\n" in m.prometheus()
@@ -0,0 +1,103 @@
+import os
+import hashlib
+
+import pytest
+
+import rpc
+import txfiles
+import jsonio
+import Block
+from chainstate import ChainState, canonical, MALFORMED, DOUBLE_SPEND, ALREADY_PENDING, OVERSPEND
+from conftest import make_tx, make_block, write_block
+
+# make_tx signs nothing and uses an empty pubkey, so coins go to that key's address
+OWNER = Block.address_from_pub("")
+
+
+@pytest.fixture
+def service(tmp_path, blocks_dir):
+    coinbase = make_tx([], [(OWNER, 50), (OWNER, 50)])
+    g, genesis = make_block(0, "NA", [coinbase])
+    write_block(blocks_dir, g, genesis)
+    state = ChainState(blocks_dir)
+    state.load()
+    pending = tmp_path / "PendingTransactions"
+    pending.mkdir()
+    svc = rpc.RpcService(state, str(pending),
+                         precheck_tx=lambda tx: Block.check_tx_stateless(tx, check_signatures=False),
+                         check_tx=Block.check_tx_stateful)
+    svc.coinbase = coinbase
+    return svc
+
+
+def call(svc, method, **params):
+    return svc.call({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+
+
+@pytest.mark.parametrize("txid", ["../secret", "../../secret", "A" * 64, "a" * 63, 5, None])
+def test_get_tx_refuses_ids_that_are_not_hashes(service, tmp_path, txid):
+    with open(tmp_path / "secret.json", "w") as f:
+        f.write('{"leak": true}')
+    resp = call(service, "get_tx", txid=txid)
+    assert resp["error"]["code"] == rpc.INVALID_PARAMS
+
+
+def test_get_tx_finds_confirmed_and_pending(service):
+    coinbase = service.coinbase
+    assert call(service, "get_tx", txid=coinbase["txid"])["result"]["status"] == "confirmed"
+    tx = make_tx([(coinbase["txid"], 0)], [("carol", 50)], nonce=1)
+    assert call(service, "submit_tx", tx=tx)["result"]["accepted"]
+    assert call(service, "get_tx", txid=tx["txid"])["result"]["status"] == "pending"
+    assert call(service, "get_tx", txid="f" * 64)["error"]["code"] == rpc.SERVER_ERROR
+
+
+def submit(svc, tx):
+    return call(svc, "submit_tx", tx=tx)["result"]
+
+
+def test_accepted_tx_is_written_whole_at_its_sharded_path(service):
+    tx = make_tx([(service.coinbase["txid"], 0)], [("carol", 50)], nonce=1)
+    assert submit(service, tx) == {"txid": tx["txid"], "accepted": True, "code": None, "reason": None}
+    path = txfiles.path_for(service.pending_dir, tx["txid"])
+    with open(path, "rb") as f:
+        assert jsonio.load(f) == tx
+    leftovers = [f for _d, _s, files in os.walk(service.pending_dir) for f in files if f.endswith(".tmp")]
+    assert leftovers == []
+
+
+def test_reject_codes(service):
+    cb = service.coinbase["txid"]
+    tx = make_tx([(cb, 0)], [("carol", 50)], nonce=1)
+    assert submit(service, tx)["accepted"]
+    assert submit(service, tx)["code"] == ALREADY_PENDING
+    assert submit(service, make_tx([(cb, 0)], [("dave", 50)], nonce=2))["code"] == DOUBLE_SPEND
+    assert submit(service, make_tx([(cb, 1)], [("dave", 51)], nonce=3))["code"] == OVERSPEND
+    assert len(list(txfiles.iter_files(service.pending_dir))) == 1
+
+
+def test_malformed_tx_is_a_reject_not_a_server_error(service):
+    body = {"timestamp": 1, "inputs": [], "outputs": [5]}
+    tx = {"txid": hashlib.sha256(canonical(body).encode()).hexdigest(), "body": body, "inputs": []}
+    result = submit(service, tx)
+    assert result["accepted"] is False and result["code"] == MALFORMED
+
+
+def test_exception_in_a_check_is_reported_as_malformed(service):
+    def explode(*_args):
+        raise TypeError("argument of type 'int' is not iterable")
+    service.mempool.check_tx = explode
+    tx = make_tx([(service.coinbase["txid"], 0)], [("carol", 50)], nonce=1)
+    assert submit(service, tx)["code"] == MALFORMED
+    service.mempool.precheck_tx = explode
+    assert submit(service, tx)["code"] == MALFORMED
+    assert list(txfiles.iter_files(service.pending_dir)) == []
+
+
+def test_batch_gets_one_response_per_request(service):
+    cb = service.coinbase["txid"]
+    txs = [make_tx([(cb, i)], [("carol", 50)], nonce=i) for i in range(2)]
+    batch = [{"jsonrpc": "2.0", "id": i, "method": "submit_tx", "params": {"tx": tx}} for i, tx in enumerate(txs)]
+    batch.append({"jsonrpc": "2.0", "method": "get_tip", "params": {}})  # a notification: no response
+    out = service.handle(batch)
+    assert [r["id"] for r in out] == [0, 1]
+    assert all(r["result"]["accepted"] for r in out)
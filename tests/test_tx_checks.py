@@ -0,0 +1,54 @@
+import hashlib
+
+import pytest
+
+import Block
+from chainstate import canonical, MALFORMED, BAD_OUTPUT, MISSING_INPUT
+from conftest import make_tx
+
+
+def with_body(body, inputs=None):
+    # a tx whose txid matches body, so the shape checks after the txid check are reached
+    return {"txid": hashlib.sha256(canonical(body).encode()).hexdigest(), "body": body,
+            "inputs": inputs if inputs is not None else []}
+
+
+def ok_body(**changes):
+    body = {"timestamp": 1, "inputs": [], "outputs": [{"address": "a", "value": 1}]}
+    body.update(changes)
+    return body
+
+
+MALFORMED_TXS = [
+    ("not a dict", [1, 2]),
+    ("txid not a string", {"txid": 5, "body": ok_body(), "inputs": []}),
+    ("body not a dict", {"txid": "0" * 64, "body": [1], "inputs": []}),
+    ("inputs not a list", {"txid": "0" * 64, "body": ok_body(), "inputs": 7}),
+    ("input not a dict", {"txid": "0" * 64, "body": ok_body(), "inputs": [3]}),
+    ("body outputs not a list", with_body(ok_body(outputs=5))),
+    ("body inputs not a list", with_body(ok_body(inputs="x"))),
+    ("output not a dict", with_body(ok_body(outputs=[5]))),
+    ("output address not a string", with_body(ok_body(outputs=[{"address": 1, "value": 1}]))),
+    ("prev_index not an int", with_body(ok_body(), [{"prev_txid": "a", "prev_index": "0",
+                                                      "pubkey": "", "signature": ""}])),
+    ("pubkey missing", with_body(ok_body(), [{"prev_txid": "a", "prev_index": 0, "signature": ""}])),
+]
+
+
+@pytest.mark.parametrize("tx", [tx for _name, tx in MALFORMED_TXS], ids=[name for name, _tx in MALFORMED_TXS])
+def test_malformed_shapes_are_rejected_not_raised(tx):
+    reject = Block.check_tx_stateless(tx)
+    assert reject is not None and reject.code == MALFORMED
+    result = Block.validate_transaction(tx, {}, check_signatures=False)
+    assert not result and result.code == MALFORMED
+
+
+@pytest.mark.parametrize("value", [True, -1, 1.5, "1"])
+def test_bad_output_values(value):
+    tx = with_body(ok_body(outputs=[{"address": "a", "value": value}]))
+    assert Block.validate_transaction(tx, {}, check_signatures=False).code == BAD_OUTPUT
+
+
+def test_well_formed_tx_reaches_the_utxo_checks():
+    tx = make_tx([("f" * 64, 0)], [("bob", 1)])
+    assert Block.validate_transaction(tx, {}, check_signatures=False).code == MISSING_INPUT
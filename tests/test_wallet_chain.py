@@ -0,0 +1,57 @@
+from chainstate import ChainState
+from chain_index import ChainIndex
+from wallet_chain import WalletChain
+from conftest import make_tx, make_block, write_block
+from test_chainstate import build_branches
+
+
+def write_all(blocks_dir, branch):
+    for bhash, blk in branch:
+        write_block(blocks_dir, bhash, blk)
+
+
+def miner_index(blocks_dir, db):
+    state = ChainState(blocks_dir, persist_undo=False)
+    state.load()
+    index = ChainIndex(db, blocks_dir)
+    index.attach(state)
+    return state, index
+
+
+def test_reads_the_miner_index_while_it_is_current(tmp_path, blocks_dir):
+    a, b = build_branches(blocks_dir)
+    write_all(blocks_dir, a + b[1:])
+    db = str(tmp_path / "chain_index.db")
+    _state, index = miner_index(blocks_dir, db)
+    chain = WalletChain(blocks_dir, db)
+    assert chain.height() == 5  # the longer branch, not the number of block files
+    assert chain.balance("dave") == 25
+    items, nxt = chain.history("dave", 2)
+    assert [i["height"] for i in items] == [5, 4] and nxt is not None
+    items, _ = chain.history("dave", 10, nxt)
+    assert [i["height"] for i in items] == [3, 2, 1]
+    assert chain._state is None  # Blocks/ was never loaded
+    index.close()
+
+
+def test_falls_back_to_blocks_when_the_index_is_missing_or_stale(tmp_path, blocks_dir):
+    a, b = build_branches(blocks_dir)
+    write_all(blocks_dir, a)
+    db = str(tmp_path / "chain_index.db")
+    _state, index = miner_index(blocks_dir, db)
+    index.close()
+
+    missing = WalletChain(blocks_dir, str(tmp_path / "none.db"))
+    assert missing.height() == 4 and missing.balance("carol") == 40
+
+    write_all(blocks_dir, b[1:])  # the miner has not caught up
+    chain = WalletChain(blocks_dir, db)
+    assert chain.height() == 5
+    assert chain.balance("carol") == 0 and chain.balance("dave") == 25
+    assert chain._state is not None
+
+    tip = b[-1][0]
+    nxt = make_block(6, tip, [make_tx([], [("dave", 1)], nonce=60)])
+    write_block(blocks_dir, *nxt)
+    assert chain.height() == 6 and chain.balance("dave") == 26
+    chain.close()
@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+import shutil
+import importlib.util
+
+import txfiles
+from conftest import ROOT, make_tx
+
+
+def load_wallet(tmp_path, monkeypatch):
+    # a copy of wallet_A/wallet.py under tmp_path, so its SHARED dirs land there
+    monkeypatch.setattr(sys, "path", list(sys.path))  # the wallet adds SHARED to it
+    wdir = tmp_path / "wallet_A"
+    wdir.mkdir()
+    shutil.copy(os.path.join(ROOT, "wallet_A", "wallet.py"), wdir / "wallet.py")
+    spec = importlib.util.spec_from_file_location("test_wallet", wdir / "wallet.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_pending_tx_lands_in_its_shard(tmp_path, monkeypatch):
+    wallet = load_wallet(tmp_path, monkeypatch)
+    tx = make_tx([("ab" * 32, 0)], [("bob", 5)], nonce=1)
+    wallet.write_pending(tx)
+
+    pending = str(tmp_path / "PendingTransactions")
+    txid = tx["txid"]
+    expected = os.path.join(pending, txid[:2], txid[2:4], txid + ".json")
+    assert txfiles.locate(pending, txid) == expected
+    with open(expected) as f:
+        assert json.load(f) == tx
+    assert list(txfiles.iter_files(pending)) == [os.path.join(txid[:2], txid[2:4], txid + ".json")]
+    assert os.listdir(os.path.dirname(expected)) == [txid + ".json"]  # no temp file left behind
@@ -0,0 +1,108 @@
+import os
+import sys
+import argparse
+from typing import Iterator, List, Optional
+
+
+# Hash-prefix sharded layout for transaction directories (PendingTransactions/):
+#
+#   PendingTransactions/ab/cd/abcd1234....json     <txid>.json under txid[:2]/txid[2:4]
+#
+#   python txfiles.py migrate [PendingTransactions ...]
+#
+# With hundreds of thousands of files one flat directory makes every listdir
+# and lookup slow; 65536 shards keep each directory small. Writers (wallets,
+# rpc, node) put new files in their shard. Readers go through iter_files() /
+# locate(), which also see flat files at the top level, so pending files
+# from older wallets still get mined. migrate moves those into shards. Paths are
+# handed around relative to the directory ("ab/cd/<txid>.json" or "<txid>.json"),
+# and sorted by file name, so the order is the same as with the flat layout.
+
+SUFFIX = ".json"
+
+
+def shard(name: str) -> str:
+    # "ab/cd" for "abcd...json"; short or odd names share one catch-all shard
+    stem = name[:-len(SUFFIX)] if name.endswith(SUFFIX) else name
+    if len(stem) < 4 or not stem[:4].isalnum():
+        return os.path.join("__", "__")
+    return os.path.join(stem[:2].lower(), stem[2:4].lower())
+
+
+def rel_path(name: str) -> str:
+    return os.path.join(shard(name), name)
+
+
+def path_for(root: str, txid: str, create: bool = False) -> str:
+    # where <txid>.json goes in the sharded layout
+    name = txid + SUFFIX
+    d = os.path.join(root, shard(name))
+    if create:
+        os.makedirs(d, exist_ok=True)
+    return os.path.join(d, name)
+
+
+def locate(root: str, txid: str) -> Optional[str]:
+    # existing file for txid, sharded or flat, or None
+    for path in (path_for(root, txid), os.path.join(root, txid + SUFFIX)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def iter_files(root: str) -> Iterator[str]:
+    # relative paths of every *.json under root: flat files plus two shard levels
+    try:
+        top = os.scandir(root)
+    except FileNotFoundError:
+        return
+    with top:
+        for e in top:
+            if e.name.endswith(SUFFIX) and e.is_file():
+                yield e.name
+            elif e.is_dir() and len(e.name) == 2:
+                with os.scandir(e.path) as level1:
+                    for e1 in level1:
+                        if not e1.is_dir():
+                            continue
+                        with os.scandir(e1.path) as level2:
+                            for e2 in level2:
+                                if e2.name.endswith(SUFFIX):
+                                    yield os.path.join(e.name, e1.name, e2.name)
+
+
+def list_sorted(root: str) -> List[str]:
+    # relative paths in file name order, the order the miner validates in
+    return sorted(iter_files(root), key=os.path.basename)
+
+
+def migrate(root: str) -> int:
+    # move flat <name>.json files into their shards; returns files moved
+    moved = 0
+    with os.scandir(root) as it:
+        flat = [e.name for e in it if e.name.endswith(SUFFIX) and e.is_file()]
+    for name in flat:
+        dest = os.path.join(root, rel_path(name))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(os.path.join(root, name), dest)
+        moved += 1
+    return moved
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Sharded transaction directory tools.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("migrate", help="move flat files into ab/cd/ shards")
+    m.add_argument("dirs", nargs="*", default=["PendingTransactions"])
+    args = ap.parse_args(argv)
+
+    for d in args.dirs:
+        if not os.path.isdir(d):
+            print(f"{d}: not a directory, skipped")
+            continue
+        print(f"{d}: moved {migrate(d)} file(s) into shards")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
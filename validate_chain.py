@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+import jsonio
+from chainstate import ChainState, canonical, connect_block, check_block, load_checkpoint
+from Block import validate_transaction, verify_signature
+
+
+# validate-chain: re-check an existing Blocks/ directory end to end.
+#
+#   python validate_chain.py [--blocks-dir Blocks] [--workers N] [--range-size 500]
+#                            [--write-checkpoint checkpoint.json] [--assume-valid checkpoint.json]
+#
+# Pass 1 (sequential, cheap): file/shape, header hash == file name, height and
+# previousblock linkage, merkle_root, body hash, PoW/difficulty, and every
+# transaction against the running UTXO set without its RSA signatures.
+# Pass 2 (parallel): input signatures, farmed out to a process pool in
+# contiguous block ranges. The first invalid block from either pass is reported.
+# With --assume-valid, pass 2 skips blocks at or below that checkpoint.
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def _verify_range(args) -> Tuple[int, Optional[Tuple[int, str]]]:
+    # worker: verify every input signature in the given block files
+    paths = args
+    checked = 0
+    for height, path in paths:
+        with open(path, "rb") as f:
+            blk = jsonio.load(f)
+        if height == 0:
+            continue  # genesis carries only the coinbase
+        for tx in blk["body"]:
+            if not isinstance(tx, dict) or "txid" not in tx or "body" not in tx:
+                continue
+            body_bytes = canonical(tx["body"]).encode()
+            for inp in tx.get("inputs", []):
+                checked += 1
+                if not verify_signature(inp["pubkey"], body_bytes, inp["signature"]):
+                    return checked, (height, f"bad signature in tx {tx['txid']}")
+    return checked, None
+
+
+def validate(blocks_dir: str, workers: Optional[int] = None, range_size: int = 500,
+             assume_valid: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    state = ChainState(blocks_dir, assume_valid=assume_valid)
+    bad_files = state.scan()
+    errors: List[Tuple[int, str, str]] = []  # (height, hash/file, reason)
+    for fname in bad_files:
+        errors.append((-1, fname, "unreadable or not a block"))
+
+    tip = state.best_entry()
+    chain = []
+    e = tip
+    while e is not None:
+        chain.append(e)
+        e = e.parent
+    chain.reverse()
+
+    # blocks that never made it into the index failed linkage/PoW/difficulty
+    indexed = set(state.index)
+    for fname in os.listdir(blocks_dir):
+        if fname.endswith(".json") and fname not in bad_files and fname[:-5] not in indexed:
+            errors.append((-1, fname, "orphan or bad header (linkage/PoW/difficulty)"))
+
+    # pass 1: headers + stateful checks, in height order along the best chain
+    utxos: Dict[str, Dict[str, Any]] = {}
+    first_bad_height = None
+    for e in chain:
+        blk = state.read_block(e.hash)
+        reason = check_block(blk, e.hash)
+        if reason is None and e.parent is not None:
+            for tx in blk["body"]:
+                if not isinstance(tx, dict) or "txid" not in tx or "body" not in tx:
+                    continue
+                result = validate_transaction(tx, utxos, check_signatures=False)
+                if not result:
+                    reason = f"invalid transaction {tx.get('txid')}: {result.reject} ({result.code})"
+                    break
+                connect_block(utxos, {"body": [tx]})
+        elif reason is None:
+            connect_block(utxos, blk)
+        if reason is not None:
+            errors.append((e.height, e.hash, reason))
+            first_bad_height = e.height
+            break
+    header_secs = time.perf_counter() - t0
+
+    # pass 2: signatures over the part of the chain that passed pass 1
+    good = [x for x in chain if (first_bad_height is None or x.height < first_bad_height)
+            and x.hash not in state.assumed_hashes]
+    jobs = []
+    for i in range(0, len(good), range_size):
+        jobs.append([(x.height, state.block_path(x.hash)) for x in good[i:i + range_size]])
+
+    t1 = time.perf_counter()
+    sigs = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for checked, bad in pool.map(_verify_range, jobs):
+            sigs += checked
+            if bad is not None:
+                height, reason = bad
+                errors.append((height, chain[height - chain[0].height].hash, reason))
+    sig_secs = time.perf_counter() - t1
+
+    errors.sort(key=lambda x: x[0])
+    chain_errors = [x for x in errors if x[0] >= 0]
+    valid_until = (chain_errors[0][0] - 1) if chain_errors else (tip.height if tip else -1)
+    total = time.perf_counter() - t0
+    return {
+        "blocks": len(chain),
+        "tip_height": tip.height if tip else None,
+        "tip_hash": tip.hash if tip else None,
+        "valid_until": valid_until,
+        "first_invalid": chain_errors[0] if chain_errors else None,
+        "errors": errors,
+        "signatures": sigs,
+        "assumed_valid": len(state.assumed_hashes),
+        "seconds": total,
+        "blocks_per_sec": len(chain) / header_secs if header_secs > 0 else 0.0,
+        "sigs_per_sec": sigs / sig_secs if sig_secs > 0 else 0.0,
+        "chain": chain,
+    }
+
+
+def write_checkpoint(path: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # record the last fully validated block as trusted
+    height = result["valid_until"]
+    if height < 0:
+        return None
+    entry = next(x for x in result["chain"] if x.height == height)
+    cp = {"height": height, "hash": entry.hash, "validated_at": int(time.time())}
+    with open(path, "w") as f:
+        json.dump(cp, f, indent=2)
+    return cp
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="validate-chain", description="Validate a Blocks/ directory.")
+    ap.add_argument("--blocks-dir", default="Blocks")
+    ap.add_argument("--workers", type=int, default=None, help="signature worker processes (default: all cores)")
+    ap.add_argument("--range-size", type=int, default=500, help="blocks per signature job")
+    ap.add_argument("--write-checkpoint", nargs="?", const=CHECKPOINT_FILE, default=None,
+                    metavar="PATH", help=f"write a trusted checkpoint (default path {CHECKPOINT_FILE})")
+    ap.add_argument("--assume-valid", default=None, metavar="PATH",
+                    help="skip signature checks at or below this checkpoint")
+    args = ap.parse_args(argv)
+
+    cp = load_checkpoint(args.assume_valid) if args.assume_valid else None
+    res = validate(args.blocks_dir, args.workers, args.range_size, cp)
+    for height, name, reason in res["errors"]:
+        where = f"height {height}" if height >= 0 else "file"
+        print(f"[invalid] {where} {name}: {reason}")
+    print(f"blocks on best chain: {res['blocks']} (tip height {res['tip_height']})")
+    print(f"signatures checked:  {res['signatures']}")
+    if res["assumed_valid"]:
+        print(f"assumed valid:       {res['assumed_valid']} block(s), signatures skipped")
+    print(f"throughput: {res['blocks_per_sec']:.1f} blocks/s (headers+state), "
+          f"{res['sigs_per_sec']:.1f} sigs/s, {res['seconds']:.2f}s total")
+    if res["first_invalid"]:
+        height, bhash, reason = res["first_invalid"]
+        print(f"FIRST INVALID BLOCK: height {height} {bhash} ({reason})")
+    else:
+        print("chain OK")
+
+    if args.write_checkpoint:
+        cp = write_checkpoint(args.write_checkpoint, res)
+        if cp:
+            print(f"checkpoint written to {args.write_checkpoint}: height {cp['height']} {cp['hash']}")
+    return 1 if res["first_invalid"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
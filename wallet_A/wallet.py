@@ -1,9 +1,10 @@
 
-import os, json, hashlib, time, shutil
+import os, sys, json, hashlib, time, argparse
 from typing import Dict, Any, List
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+
+# cryptography, chainstate and wallet_chain are imported where they are used:
+# checking a balance only needs the public key (cached in PUB_FILE), so only
+# signing a draft pays for loading cryptography and the private key.
 
 
 WALLET_LABEL = "A" 
@@ -11,12 +12,17 @@ WALLET_LABEL = "A"
 ROOT = os.path.dirname(os.path.abspath(__file__))      # wallet_A
 SHARED = os.path.abspath(os.path.join(ROOT, ".."))     
 PEM_FILE = os.path.join(ROOT, "private_key.pem")
+PUB_FILE = os.path.join(ROOT, "public_key.json")           # {pem_sha256, pubkey_pem}, derived from PEM_FILE
 
 ADDRESSES = os.path.join(SHARED, "addresses.json")
 BLOCKS_DIR = os.path.join(SHARED, "Blocks")
 PENDING_DIR = os.path.join(SHARED, "PendingTransactions")
 TX_REQUESTS_DIR = os.path.join(SHARED, "tx_requests")
 TX_REQUESTS_DONE = os.path.join(TX_REQUESTS_DIR, "processed")
+CHAIN_INDEX_DB = os.path.join(SHARED, "chain_index.db")   # kept by the miner, see chain_index.py
+
+sys.path.insert(0, SHARED)
+import txfiles   # the miner's sharded PendingTransactions/ layout
 
 os.makedirs(BLOCKS_DIR, exist_ok=True)
 os.makedirs(PENDING_DIR, exist_ok=True)
@@ -25,20 +31,61 @@ os.makedirs(TX_REQUESTS_DONE, exist_ok=True)
 
 def canonical(obj): return json.dumps(obj, separators=(',', ':'), sort_keys=True)
 
-def load_or_create_key():
+def _load_private_key():
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
     if os.path.exists(PEM_FILE):
         with open(PEM_FILE, "rb") as f:
-            priv = serialization.load_pem_private_key(f.read(), password=None, backend=default_backend())
+            return serialization.load_pem_private_key(f.read(), password=None, backend=default_backend())
+    priv = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with open(PEM_FILE, "wb") as f:
+        f.write(priv.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()))
+    return priv
+
+class LazyKey:
+    # the private key, loaded from PEM_FILE on the first sign()
+    def __init__(self, priv=None):
+        self._priv = priv
+
+    def sign(self, data, pad, algorithm):
+        if self._priv is None:
+            self._priv = _load_private_key()
+        return self._priv.sign(data, pad, algorithm)
+
+def _pem_digest() -> str | None:
+    try:
+        with open(PEM_FILE, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def _cached_pub_pem(digest: str | None) -> str | None:
+    # public key saved for this exact private key file, else None
+    try:
+        with open(PUB_FILE, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if digest is None or not isinstance(cached, dict) or cached.get("pem_sha256") != digest:
+        return None
+    return cached.get("pubkey_pem")
+
+def load_or_create_key():
+    pub_pem = _cached_pub_pem(_pem_digest())
+    if pub_pem is not None:
+        priv = LazyKey()
     else:
-        priv = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-        with open(PEM_FILE, "wb") as f:
-            f.write(priv.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()))
-    pub = priv.public_key()
-    pub_pem = pub.public_bytes(encoding=serialization.Encoding.PEM,
-                               format=serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        from cryptography.hazmat.primitives import serialization
+        key = _load_private_key()
+        pub_pem = key.public_key().public_bytes(encoding=serialization.Encoding.PEM,
+                                                format=serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+        with open(PUB_FILE, "w") as f:
+            json.dump({"pem_sha256": _pem_digest(), "pubkey_pem": pub_pem}, f, indent=2)
+        priv = LazyKey(key)
     address = hashlib.sha256(pub_pem.encode()).hexdigest()
     return priv, pub_pem, address
 
@@ -46,7 +93,10 @@ def register_address(label: str, address: str, pub_pem: str):
     book = {}
     if os.path.exists(ADDRESSES):
         with open(ADDRESSES, "r") as f: book = json.load(f)
-    book[label] = {"address": address, "pubkey_pem": pub_pem}
+    entry = {"address": address, "pubkey_pem": pub_pem}
+    if book.get(label) == entry:
+        return
+    book[label] = entry
     with open(ADDRESSES, "w") as f: json.dump(book, f, indent=2)
 
 def resolve_recipient(val: str) -> str:
@@ -102,9 +152,23 @@ def build_utxos(blocks):
     return utxos
 
 
+_chain = None
+
+def chain_view():
+    # balance, history and height of the active chain: the miner's chain index
+    # while it is current, else Blocks/ (see ../wallet_chain.py)
+    global _chain
+    if _chain is None:
+        import wallet_chain
+        _chain = wallet_chain.WalletChain(BLOCKS_DIR, CHAIN_INDEX_DB)
+    return _chain
+
 def balance_of(address: str) -> int:
-    utxos = build_utxos(load_blocks())
-    return sum(u["value"] for u in utxos.values() if u["address"] == address)
+    return chain_view().balance(address)
+
+def recent_history(address: str, limit: int = 10, cursor: str | None = None):
+    # one page of {height, txid, delta}, newest first, and the cursor for the next one
+    return chain_view().history(address, limit, cursor)
 
 def select_utxos(utxos, addr, amount):
     total, picks = 0, []
@@ -120,6 +184,8 @@ def txid_from_body(body: dict) -> str:
     return hashlib.sha256(canonical(body).encode()).hexdigest()
 
 def sign_body(priv, body: dict) -> str:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
     sig = priv.sign(canonical(body).encode(), padding.PKCS1v15(), hashes.SHA256())
     return sig.hex()
 
@@ -145,9 +211,14 @@ def create_signed_transaction(priv, pub_pem, my_address, to_address, amount):
     signed_inputs = [{**i, "pubkey": pub_pem, "signature": sig_hex} for i in inputs_ref]
     return {"txid": tid, "body": body, "inputs": signed_inputs}
 
+def pending_path(txid: str) -> str:
+    return txfiles.path_for(PENDING_DIR, txid, create=True)
+
 def write_pending(tx):
-    out = os.path.join(PENDING_DIR, f"{tx['txid']}.json")
-    with open(out, "w") as f: json.dump(tx, f, indent=2)
+    # atomic: the miner may scan PendingTransactions/ while we write
+    from chainstate import write_json_atomic
+    out = pending_path(tx["txid"])
+    write_json_atomic(out, tx, indent=2)
     print("Published signed tx:", out)
 
 def _pick_latest_draft_for_me(my_label: str) -> str | None:
@@ -164,7 +235,8 @@ def _pick_latest_draft_for_me(my_label: str) -> str | None:
     return None
 
 
-def writeSignedTX(priv, pub_pem: str, my_address: str, my_label: str, draft_filename: str | None = None) -> str | None:
+def writeSignedTX(priv, pub_pem: str, my_address: str, my_label: str, draft_filename: str | None = None,
+                  quiet_if_none: bool = False) -> str | None:
     # 1) choose draft
     if draft_filename is None:
         draft_filename = _pick_latest_draft_for_me(my_label)
@@ -241,9 +313,9 @@ def writeSignedTX(priv, pub_pem: str, my_address: str, my_label: str, draft_file
 
     # 6) write signed tx to pending and move draft to processed
         # 6) write signed tx to pending
-    out_path = os.path.join(PENDING_DIR, f"{tid}.json")
-    with open(out_path, "w") as f:
-        json.dump(tx, f, indent=2)
+    from chainstate import write_json_atomic
+    out_path = pending_path(tid)
+    write_json_atomic(out_path, tx, indent=2)
 
     # 7) write normalized draft-with-signature into processed/
     processed_path = os.path.join(TX_REQUESTS_DONE, draft_filename)
@@ -337,26 +409,39 @@ def build_processed_draft(draft: dict, signature: str, default_sender_label: str
 
 
 
-priv, pub_pem, my_addr = load_or_create_key()
-register_address(WALLET_LABEL, my_addr, pub_pem)
-print(f"[Wallet {WALLET_LABEL}] Address: {my_addr}")
-print("Balance:", balance_of(my_addr))
-
-target = get_receiver_from_latest_draft(WALLET_LABEL)
-if target:
-    addr = resolve_recipient(target)
-    print(f"Balance({target}):", balance_of(addr))
-
-# First, process ALL drafts for THIS sender
-processed = process_my_drafts(WALLET_LABEL, my_addr, priv, pub_pem)
-
-# If none were found/processed,  try a single ad-hoc sign of the newest draft
-if processed == 0:
-    writeSignedTX(priv, pub_pem, my_addr, WALLET_LABEL, draft_filename=None, quiet_if_none=True)
-
-
+def main() -> dict:
+    priv, pub_pem, my_addr = load_or_create_key()
+    register_address(WALLET_LABEL, my_addr, pub_pem)
+    print(f"[Wallet {WALLET_LABEL}] Address: {my_addr}")
+    print("Balance:", balance_of(my_addr))
+    items, _next = recent_history(my_addr)
+    for item in items:
+        print(f"  #{item['height']} {item['txid'][:16]}… {item['delta']:+d}")
 
+    target = get_receiver_from_latest_draft(WALLET_LABEL)
+    if target:
+        addr = resolve_recipient(target)
+        print(f"Balance({target}):", balance_of(addr))
 
+    # First, process ALL drafts for THIS sender
+    processed = process_my_drafts(WALLET_LABEL, my_addr, priv, pub_pem)
 
+    # If none were found/processed,  try a single ad-hoc sign of the newest draft
+    if processed == 0:
+        writeSignedTX(priv, pub_pem, my_addr, WALLET_LABEL, draft_filename=None, quiet_if_none=True)
+    # tip of the active chain; counting block files would include side branches
+    return {"height": chain_view().height(), "batch": processed}
 
 
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=f"Wallet {WALLET_LABEL}: show balance and sign pending drafts.")
+    ap.add_argument("--profile", type=int, default=0, metavar="N",
+                    help="run N cycles under cProfile, one profile per cycle (see ../profiling.py)")
+    ap.add_argument("--profile-dir", default=os.path.join(SHARED, "profiles"))
+    args = ap.parse_args()
+    if args.profile:
+        import profiling
+        for n in range(1, args.profile + 1):
+            profiling.profile_cycle(main, f"wallet_{WALLET_LABEL}", n, args.profile_dir)
+    else:
+        main()
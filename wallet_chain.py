@@ -0,0 +1,67 @@
+import os
+from typing import List, Dict, Any, Optional, Tuple
+
+from chainstate import ChainState
+from chain_index import ChainIndex
+
+
+# Chain reads shared by the wallets (wallet_A/B/C/wallet.py): balance, history
+# and tip height of the active chain.
+#
+#   chain = WalletChain(BLOCKS_DIR, CHAIN_INDEX_DB)
+#   chain.balance(address); chain.history(address, 10); chain.height()
+#
+# Answers come from the miner's chain_index.db, opened read-only, while it is
+# current. When it is missing or stale, the wallet loads Blocks/ itself into a
+# read-only ChainState with an in-memory index on top, so both paths give the
+# same answers for the same chain, forks included. Later calls only scan new
+# block files.
+
+
+class WalletChain:
+    def __init__(self, blocks_dir: str, index_db: str):
+        self.blocks_dir = blocks_dir
+        self.index_db = index_db
+        self._state: Optional[ChainState] = None
+        self._local: Optional[ChainIndex] = None
+
+    def close(self) -> None:
+        if self._local is not None:
+            self._local.close()
+
+    def _index(self) -> ChainIndex:
+        # the miner's index if it is current, else our own over Blocks/
+        if os.path.exists(self.index_db):
+            shared = ChainIndex(self.index_db, self.blocks_dir, readonly=True)
+            if not shared.is_stale():
+                return shared
+            shared.close()
+        if self._state is None:
+            self._state = ChainState(self.blocks_dir, persist_undo=False)
+            self._state.load()
+            self._local = ChainIndex(":memory:", self.blocks_dir)
+            self._local.attach(self._state)
+        else:
+            self._state.refresh()
+        return self._local
+
+    def _query(self, fn):
+        index = self._index()
+        try:
+            return fn(index)
+        finally:
+            if index is not self._local:
+                index.close()
+
+    def balance(self, address: str) -> int:
+        return self._query(lambda index: index.balance(address))
+
+    def history(self, address: str, limit: int = 10,
+                cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # newest first; pass the returned cursor back for the next page
+        return self._query(lambda index: index.history(address, limit, cursor))
+
+    def height(self) -> int:
+        # height of the active chain's tip, -1 before genesis
+        tip = self._query(lambda index: index.tip())
+        return tip[0] if tip else -1